@@ -3,9 +3,13 @@
 from serial.tools.list_ports import comports
 from tkinter.ttk import Combobox
 # for DeviceSelection, MainClass
-from module import SerialDevice, TkWindow
-from tkinter.ttk import Style, Frame, Button, Label, Entry  # Combobox used aswell, but already imported above
-from tkinter import StringVar
+from module import SerialDevice, TkWindow, RenderGovernor, QtWindow, Profiler
+from tkinter.ttk import Style, Frame, Button, Label, Entry, Checkbutton  # Combobox used aswell, but already imported above
+from tkinter import StringVar, BooleanVar
+from tkinter.messagebox import showerror
+# for MainClass
+from channels import parse_definitions
+from stream import StreamServer
 # for __main__
 import modes as Modes
 from inspect import getmembers, isclass
@@ -18,6 +22,12 @@ application_title = 'PyScilloscope'
 d_timer_interval = 2  # default timer interval in milliseconds
 d_second_graph = 3  # default value for the seconds logged via graphing
 d_voltage = 3.29  # measured voltage of the pyboard
+d_view = 'Grid'  # default way the graphs are laid out, see modes.Main.views
+d_render_preset = 'Auto'  # default trade-off between the quality and speed of the graphs, see RenderGovernor.presets
+d_profile = False  # whether or not each stage of the pipeline is timed by default
+d_stream_host = '0.0.0.0'  # the interface streamed on by default, '127.0.0.1' for only this computer
+d_stream_port = ''  # the port streamed on by default, blank for not streaming
+d_math_channels = ''  # default math channels, ex: 'Diff = X1 - X2; Current = X3 / 0.1'
 
 # Ranges
 r_timer_interval = (1, 5)  # range of timer intervals the user is able to choose
@@ -81,6 +91,11 @@ class MainClass(TkWindow):
         # init variables
         self._frame_buffer_size = 8
         self._options_box_width = 5
+        self._math_box_width = 30
+        self._profile_interval = 1000  # how often (in ms) the profile summary is refreshed
+        self._profiler = None
+        self._stream = None  # kept between sessions, so viewers stay connected
+        self._stream_address = None
 
         self._running = False
 
@@ -92,6 +107,7 @@ class MainClass(TkWindow):
         self._variable_state_widgets = []
 
         self.device = device
+        self._qwindow = None  # made on the first start, then kept with its graphs for every session after
 
         self._string_modes = []
         self._mode_classes = []
@@ -112,6 +128,9 @@ class MainClass(TkWindow):
         self._build_indicator_section()
         self._build_start_section()
         self._build_options_section()
+        self._build_profile_section()
+
+        super().protocol('WM_DELETE_WINDOW', self._close)
 
     # user interface build Methods
     # these methods are specifically for building the user interface and making each element work
@@ -202,6 +221,103 @@ class MainClass(TkWindow):
         self._graph_log_box.grid(row=3, column=2, sticky='e')
         self._graph_log_box.insert(0, d_second_graph)
 
+        self._option_buffer_2 = Frame(_frame, height=self._frame_buffer_size/2)
+        self._option_buffer_2.grid(row=4, column=1)
+
+        self._math_channels_label = Label(_frame, text='Math channels:')
+        self._math_channels_label.grid(row=5, column=1, sticky='e')
+
+        self.math_channels_value = StringVar(value=d_math_channels)
+        self._math_channels_box = Entry(_frame, width=self._math_box_width, textvariable=self.math_channels_value)
+        self._math_channels_box.grid(row=5, column=2, sticky='e')
+
+        self._option_buffer_3 = Frame(_frame, height=self._frame_buffer_size/2)
+        self._option_buffer_3.grid(row=6, column=1)
+
+        self._render_preset_label = Label(_frame, text='Performance / quality:')
+        self._render_preset_label.grid(row=7, column=1, sticky='e')
+
+        self.render_preset_value = StringVar(value=d_render_preset)
+        self._render_preset_box = Combobox(_frame, values=list(RenderGovernor.presets), textvariable=self.render_preset_value, state='readonly', width=11)
+        self._render_preset_box.grid(row=7, column=2, sticky='e')
+
+        self._option_buffer_4 = Frame(_frame, height=self._frame_buffer_size/2)
+        self._option_buffer_4.grid(row=8, column=1)
+
+        def _port_validate(value):
+            return value == '' or (value.isdigit() and int(value) < 65536)
+
+        _v_p = super().register(_port_validate)
+
+        self._stream_host_label = Label(_frame, text='Stream interface:')
+        self._stream_host_label.grid(row=9, column=1, sticky='e')
+
+        self.stream_host_value = StringVar(value=d_stream_host)
+        self._stream_host_box = Entry(_frame, width=self._options_box_width, textvariable=self.stream_host_value)
+        self._stream_host_box.grid(row=9, column=2, sticky='e')
+
+        self._stream_port_label = Label(_frame, text='Stream port (blank for off):')
+        self._stream_port_label.grid(row=10, column=1, sticky='e')
+
+        self.stream_port_value = StringVar(value=d_stream_port)
+        self._stream_port_box = Entry(_frame, width=self._options_box_width, textvariable=self.stream_port_value, validate='all', validatecommand=(_v_p, '%P'))
+        self._stream_port_box.grid(row=10, column=2, sticky='e')
+
+        self._option_buffer_5 = Frame(_frame, height=self._frame_buffer_size/2)
+        self._option_buffer_5.grid(row=11, column=1)
+
+        self._view_label = Label(_frame, text='View:')
+        self._view_label.grid(row=12, column=1, sticky='e')
+
+        self.view_value = StringVar(value=d_view)
+        self._view_box = Combobox(_frame, values=Modes.Main.views, textvariable=self.view_value, state='readonly', width=11)
+        self._view_box.grid(row=12, column=2, sticky='e')
+
+    def _build_profile_section(self):
+        self._profile_frame_buffer = Frame(self.frame, height=self._frame_buffer_size)
+        self._profile_frame_buffer.grid(row=4, column=1)
+
+        self._profile_frame = Frame(self.frame)
+        self._profile_frame.grid(row=5, column=1, columnspan=3, sticky=('n', 'e', 's', 'w'))
+
+        _frame = self._profile_frame
+
+        self.profile_value = BooleanVar(value=d_profile)
+        self._profile_box = Checkbutton(_frame, text='Profile (report saved on stop)', variable=self.profile_value)
+        self._profile_box.grid(row=1, column=1, sticky='w')
+
+        self._profile_summary = Label(_frame, text='', font='TkFixedFont', justify='left')
+        self._profile_summary.grid(row=2, column=1, sticky='w')
+
+    def _update_stream(self):
+        """
+        Starts, moves, or stops the stream server to match the interface and port options
+
+        `return`: False if the interface or port could not be used
+        """
+        host = self.stream_host_value.get().strip() or d_stream_host
+        port = int(self.stream_port_value.get() or 0)
+        if self._stream and self._stream_address != (host, port):
+            self._stream.close()
+            self._stream = None
+        if port and not self._stream:
+            try:
+                self._stream = StreamServer(host, port)
+            except OSError as error:
+                showerror(application_title, f'Could not stream on {host}:{port}: {error}')
+                return False
+            self._stream_address = (host, port)  # as given, `StreamServer.host` may be resolved
+        return True
+
+    def _refresh_profile(self):
+        """
+        Shows the latest timings of the profiler, until the session is stopped
+        > called automagically
+        """
+        if self._running and self._profiler:
+            self._profile_summary.configure(text=self._profiler.summary())
+            super().after(self._profile_interval, self._refresh_profile)
+
     # UI Control
     # TODO: Implement this... the only reason it is here is for the indicator things going on, but I have not found a good way to implement this yet
     def _add_variable_widget(self, widget):
@@ -224,19 +340,51 @@ class MainClass(TkWindow):
 
         self.start_button.configure(state='enabled')
 
+    def _close(self):
+        """
+        Stops the current session, and closes the connection and the windows
+        > called automagically when the window is closed
+        """
+        if self._running:
+            self._start_command()
+        self.device.kill()
+        if self._stream:
+            self._stream.close()
+        if self._qwindow:
+            self._qwindow.close()
+        super().destroy()
+
     def _start_command(self, a=None, kw=None):
         if self._running:
+            # the session is stopped, but the connection and graphs are kept so another can be started right away
             self.start_button.configure(text='Start')
             self._running = False
             self._current_mode.stop()
-            self.quit()
+            if self._profiler:
+                self._profile_summary.configure(text=self._profiler.summary())
         elif not self._running:
+            try:
+                math_channels = parse_definitions(self.math_channels_value.get())
+            except ValueError as error:
+                showerror(application_title, str(error))
+                return
+            if not self._update_stream():
+                return
             self.start_button.configure(text='Stop')
+            if not self._qwindow:
+                self._qwindow = QtWindow('PyScilloscope Graphs')
+            self._profiler = Profiler() if self.profile_value.get() else None
             mode = self._selected_mode
-            self._current_mode = mode(device=self.device, timer_interval=self._timer_interval, seconds_range=self._seconds_range)
+            self._current_mode = mode(device=self.device, timer_interval=self._timer_interval, seconds_range=self._seconds_range, math_channels=math_channels, render_preset=self.render_preset_value.get(), window=self._qwindow, profiler=self._profiler, stream=self._stream, view=self.view_value.get())
             self._current_mode.Over.connect(self._start_command)
-            self._current_mode.start()
+            try:
+                self._current_mode.start()
+            except ValueError as error:  # the math channels don't fit the PyBoard's pins
+                self.start_button.configure(text='Start')
+                showerror(application_title, str(error))
+                return
             self._running = True
+            self._refresh_profile()
 
 
 # Main
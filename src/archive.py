@@ -0,0 +1,460 @@
+"""
+Compressed, chunked archive of raw ADC reads, for long-term retention and offline analysis
+
+The codes read from the PyBoard are 12-bit (`dmax=4095`) and move slowly, so they are stored as
+deltas (which are mostly tiny) and run through zlib, one stream per channel.
+
+__File layout:__
+- header: `MAGIC`, a uint32 length, then JSON holding the pins, the voltage source and `dmax`
+- chunks: `CHUNK_MAGIC`, the first and last time (ms since epoch), the amount of sets, the length of the
+  time stream, the length of each channel's stream, then the streams themselves
+- index: JSON list of `[first time, last time, sets, offset]` for every chunk, its uint64 offset, then `INDEX_MAGIC`
+
+The index is written when the archive is closed. If it is missing (force close, etc.) the chunks are scanned instead,
+so at most the chunk that was being filled is lost.
+
+___
+__Batch analysis:__
+
+    python archive.py info FILES...
+    python archive.py stats FILES... [--start TIME] [--end TIME] [--pins PIN...] [--workers N]
+
+`TIME` is either `YYYY-MM-DD HH:MM:SS` or milliseconds since epoch.
+`stats` computes the same values as the Normal mode (`log_methods` in `measurements.py`), decoding the chunks in a process pool.
+Each process only sends back a histogram of the codes of each pin, from which the usual values are computed exactly.
+"""
+
+# Imports
+import json
+import struct
+import zlib
+import statistics
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy
+import measurements  # for dtv, min, max, log_methods, without loading the GUI into every process
+
+# Finals
+MAGIC = b'PSCA'
+CHUNK_MAGIC = b'PSCK'
+INDEX_MAGIC = b'PSCI'
+VERSION = 1
+
+_header_length = struct.Struct('<I')
+_chunk_header = struct.Struct('<4sqqII')  # magic, first time, last time, sets, time stream length
+_index_footer = struct.Struct('<Q4s')  # index offset, magic
+
+
+# Methods
+def _histogram_median(values, counts):
+    """
+    Same as `statistics.median`, the mean of the two middle values if there is an even amount
+    """
+    ends = numpy.cumsum(counts)
+    total = ends[-1]
+    low, high = numpy.searchsorted(ends, [(total - 1) // 2, total // 2], side='right')
+    return (values[low] + values[high]) / 2
+
+
+def _histogram_variance(values, counts):
+    """
+    Same as `statistics.variance`, the sample variance
+    """
+    total = counts.sum()
+    if total < 2:
+        return numpy.nan
+    mean = (values * counts).sum() / total
+    return (counts * (values - mean) ** 2).sum() / (total - 1)
+
+
+# the usual `log_methods` computed from the (sorted) voltages and how many times each was read,
+# so months of data never have to leave the process pool
+_histogram_methods = {
+    measurements.min: lambda values, counts: values[0],
+    measurements.max: lambda values, counts: values[-1],
+    statistics.mean: lambda values, counts: (values * counts).sum() / counts.sum(),
+    statistics.median: _histogram_median,
+    statistics.variance: _histogram_variance,
+    statistics.stdev: lambda values, counts: numpy.sqrt(_histogram_variance(values, counts)),
+}
+
+
+def delta_encode(table, dtype):
+    """
+    `table`: 1-D array of integers
+    `dtype`: numpy type of the deltas
+    - must be able to hold the largest difference between two neighbouring values
+
+    `return`: `table` as the difference from the previous value, the first value being kept as is
+    """
+    deltas = numpy.empty(len(table), dtype=dtype)
+    if len(table):
+        deltas[0] = table[0]
+        numpy.subtract(table[1:], table[:-1], out=deltas[1:], casting='unsafe')
+    return deltas
+
+
+def delta_decode(deltas, dtype):
+    """
+    `deltas`: 1-D array made by `delta_encode`
+    `dtype`: numpy type of the original values
+
+    `return`: the original values
+    """
+    return numpy.cumsum(deltas, dtype='int64').astype(dtype)
+
+
+def parse_time(value):
+    """
+    `value`: `YYYY-MM-DD HH:MM:SS` (or anything `datetime.fromisoformat` takes), or milliseconds since epoch
+
+    `return`: milliseconds since epoch
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return round(datetime.fromisoformat(value).timestamp() * 1000)
+
+
+def format_time(value):
+    """
+    `value`: milliseconds since epoch
+
+    `return`: `YYYY-MM-DD HH:MM:SS.mmm`
+    """
+    return datetime.fromtimestamp(value / 1000).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+# Classes
+class ArchiveWriter:
+    """
+    Writes reads to an archive, a chunk at a time
+
+    `path`: path of the file
+    `pins`: the pins in the order their codes will be given, usually from the `start` handshake
+    `voltage`: the voltage source supplied to the ADC
+    `dmax`: the max digital value of the ADC
+    `chunk_size`: the amount of sets in each chunk
+    - bigger value = better compression, but more is lost if the program is force closed
+    `level`: zlib compression level
+    """
+
+    def __init__(self, path, pins, voltage, dmax=4095, chunk_size=4096, level=6):
+        self.path = path
+        self.pins = list(pins)
+        self.chunk_size = chunk_size
+        self.level = level
+
+        self._file = open(path, 'wb')
+        header = json.dumps({'version': VERSION, 'pins': self.pins, 'voltage': voltage, 'dmax': dmax}).encode()
+        self._file.write(MAGIC + _header_length.pack(len(header)) + header)
+
+        self._index = []
+        self._times = numpy.empty(chunk_size, dtype='int64')  # preallocated, filled up to `self._i`
+        self._codes = numpy.empty((chunk_size, len(self.pins)), dtype='uint16')
+        self._i = 0
+
+    def append(self, time, codes):
+        """
+        `time`: time of the set, in milliseconds since epoch
+        `codes`: the codes of the set in the same order as `pins`
+        """
+        self._times[self._i] = time
+        self._codes[self._i] = codes
+        self._i += 1
+        if self._i == self.chunk_size:
+            self.flush()
+
+    def extend(self, times, codes):
+        """
+        `times`: 1-D array of the times of each set, in milliseconds since epoch
+        `codes`: 2-D array of shape (sets, pins)
+        """
+        start = 0
+        while start < len(times):
+            amount = min(self.chunk_size - self._i, len(times) - start)
+            self._times[self._i:self._i + amount] = times[start:start + amount]
+            self._codes[self._i:self._i + amount] = codes[start:start + amount]
+            self._i += amount
+            start += amount
+            if self._i == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        """
+        Writes the sets collected so far as a chunk
+        """
+        if not self._i:
+            return
+        times = self._times[:self._i]
+        streams = [zlib.compress(delta_encode(self._codes[:self._i, c], 'int16').tobytes(), self.level) for c in range(len(self.pins))]
+        time_stream = zlib.compress(delta_encode(times, 'int64').tobytes(), self.level)
+        offset = self._file.tell()
+        self._file.write(_chunk_header.pack(CHUNK_MAGIC, int(times[0]), int(times[-1]), self._i, len(time_stream)))
+        self._file.write(struct.pack(f'<{len(streams)}I', *(len(s) for s in streams)))
+        self._file.write(time_stream)
+        for stream in streams:
+            self._file.write(stream)
+        self._file.flush()
+        self._index.append([int(times[0]), int(times[-1]), self._i, offset])
+        self._i = 0
+
+    def close(self):
+        """
+        Writes what is left, and the index
+        """
+        self.flush()
+        offset = self._file.tell()
+        self._file.write(json.dumps(self._index).encode())
+        self._file.write(_index_footer.pack(offset, INDEX_MAGIC))
+        self._file.close()
+
+
+class ArchiveReader:
+    """
+    Reads an archive made by `ArchiveWriter`
+
+    `path`: path of the file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        if self._file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not an archive')
+        length, = _header_length.unpack(self._file.read(_header_length.size))
+        header = json.loads(self._file.read(length))
+        self.pins = header['pins']
+        self.voltage = header['voltage']
+        self.dmax = header['dmax']
+        self._data_start = self._file.tell()
+        self.index = self._read_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def _read_index(self):
+        self._file.seek(0, 2)
+        end = self._file.tell()
+        if end - self._data_start >= _index_footer.size:
+            self._file.seek(end - _index_footer.size)
+            offset, magic = _index_footer.unpack(self._file.read(_index_footer.size))
+            if magic == INDEX_MAGIC:
+                self._file.seek(offset)
+                return [tuple(entry) for entry in json.loads(self._file.read(end - _index_footer.size - offset))]
+        return self._scan_index(end)
+
+    def _scan_index(self, end):
+        """
+        Rebuilds the index of an archive that was never closed, ignoring a partly written chunk
+        """
+        index = []
+        offset = self._data_start
+        lengths_size = 4 * len(self.pins)
+        while offset + _chunk_header.size + lengths_size <= end:
+            self._file.seek(offset)
+            magic, first, last, sets, time_length = _chunk_header.unpack(self._file.read(_chunk_header.size))
+            if magic != CHUNK_MAGIC:
+                break
+            lengths = struct.unpack(f'<{len(self.pins)}I', self._file.read(lengths_size))
+            size = _chunk_header.size + lengths_size + time_length + sum(lengths)
+            if offset + size > end:
+                break
+            index.append((first, last, sets, offset))
+            offset += size
+        return index
+
+    @property
+    def sets(self):
+        return sum(entry[2] for entry in self.index)
+
+    def chunks(self, start=None, end=None):
+        """
+        `start`: time in milliseconds since epoch, None for the beginning
+        `end`: time in milliseconds since epoch, None for the end
+
+        `return`: the index entries of the chunks that overlap `start` to `end`
+        """
+        return [entry for entry in self.index if (start is None or entry[1] >= start) and (end is None or entry[0] <= end)]
+
+    def read_chunk(self, entry, pins=None):
+        """
+        `entry`: an entry from `index`
+        `pins`: the pins to decode, None for all of them
+
+        `return`: the times of the chunk, and a dict of each pin's codes
+        """
+        pins = self.pins if pins is None else pins
+        self._file.seek(entry[3])
+        magic, first, last, sets, time_length = _chunk_header.unpack(self._file.read(_chunk_header.size))
+        lengths = struct.unpack(f'<{len(self.pins)}I', self._file.read(4 * len(self.pins)))
+        times = delta_decode(numpy.frombuffer(zlib.decompress(self._file.read(time_length)), dtype='int64'), 'int64')
+        stream_start = self._file.tell()
+        codes = {}
+        for pin in pins:
+            c = self.pins.index(pin)
+            self._file.seek(stream_start + sum(lengths[:c]))
+            codes[pin] = delta_decode(numpy.frombuffer(zlib.decompress(self._file.read(lengths[c])), dtype='int16'), 'uint16')
+        return times, codes
+
+    def read_codes(self, start=None, end=None, pins=None, entries=None):
+        """
+        `start`: time in milliseconds since epoch, None for the beginning
+        `end`: time in milliseconds since epoch, None for the end
+        `pins`: the pins to decode, None for all of them
+        `entries`: the chunks to read, None for every chunk that overlaps `start` to `end`
+
+        `return`: the times from `start` to `end`, and a dict of each pin's codes
+        """
+        pins = self.pins if pins is None else pins
+        entries = self.chunks(start, end) if entries is None else entries
+        times = []
+        codes = {pin: [] for pin in pins}
+        for entry in entries:
+            chunk_times, chunk_codes = self.read_chunk(entry, pins)
+            keep = numpy.ones(len(chunk_times), dtype=bool)
+            if start is not None:
+                keep &= chunk_times >= start
+            if end is not None:
+                keep &= chunk_times <= end
+            times.append(chunk_times[keep])
+            for pin in pins:
+                codes[pin].append(chunk_codes[pin][keep])
+        times = numpy.concatenate(times) if times else numpy.empty(0, dtype='int64')
+        return times, {pin: numpy.concatenate(c) if c else numpy.empty(0, dtype='uint16') for pin, c in codes.items()}
+
+    def read(self, start=None, end=None, pins=None, entries=None):
+        """
+        Same as `read_codes`, but each pin's codes are converted to voltages
+        """
+        times, codes = self.read_codes(start, end, pins, entries)
+        return times, {pin: measurements.dtv(c, self.voltage, self.dmax) for pin, c in codes.items()}
+
+
+# Batch analysis
+def _decode_task(path, entries, start, end, pins, decode):
+    """
+    Run in the process pool. Decodes a batch of chunks from one archive
+
+    `decode`: whether or not the voltages are sent back too, for methods that can't work from a histogram
+
+    `return`: the voltage source and `dmax` of the archive, a dict of each pin's histogram of codes,
+    and a dict of each pin's voltages (None if not `decode`)
+    """
+    with ArchiveReader(path) as reader:
+        pins = [pin for pin in pins if pin in reader.pins]
+        codes = reader.read_codes(start, end, pins, entries)[1]
+        histograms = {pin: numpy.bincount(c, minlength=reader.dmax + 1) for pin, c in codes.items()}
+        voltages = {pin: measurements.dtv(c, reader.voltage, reader.dmax) for pin, c in codes.items()} if decode else None
+        return reader.voltage, reader.dmax, histograms, voltages
+
+
+def analyze(paths, methods, start=None, end=None, pins=None, workers=None, batch=64):
+    """
+    Computes `methods` over every read from `start` to `end` in all of `paths`
+
+    `paths`: the archives to read
+    `methods`: dict of name: method, each returning a single value from a table
+    - ex: `measurements.log_methods`
+
+    `start`: time in milliseconds since epoch, None for the beginning
+    `end`: time in milliseconds since epoch, None for the end
+    `pins`: the pins to analyze, None for the pins of the first archive
+    `workers`: the amount of processes decoding, None for the amount of CPUs
+    `batch`: the amount of chunks decoded by each task
+
+    `return`: dict of pin: dict of name: value
+    - pins without any reads in the range are left out
+
+    The methods of `measurements.log_methods` are computed exactly from the summed histograms of each pin.
+    Any other method is given every voltage as a list, which is far slower over a long range.
+    """
+    tasks = []
+    for path in paths:
+        with ArchiveReader(path) as reader:
+            if pins is None:
+                pins = list(reader.pins)
+            entries = reader.chunks(start, end)
+        for i in range(0, len(entries), batch):
+            tasks.append((path, entries[i:i + batch]))
+
+    decode = any(method not in _histogram_methods for method in methods.values())
+    histograms = {pin: {} for pin in pins or []}  # pin: {(voltage, dmax): summed histogram}, as archives may differ
+    reads = {pin: [] for pin in pins or []}
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(_decode_task, path, entries, start, end, pins, decode) for path, entries in tasks]
+        for future in futures:
+            voltage, dmax, task_histograms, voltages = future.result()
+            for pin, histogram in task_histograms.items():
+                summed = histograms[pin].get((voltage, dmax))
+                histograms[pin][voltage, dmax] = histogram if summed is None else summed + histogram
+                if decode:
+                    reads[pin].append(voltages[pin])
+
+    values = {}
+    for pin in histograms:
+        bins = [(measurements.dtv(numpy.flatnonzero(h), voltage, dmax), h[h > 0]) for (voltage, dmax), h in histograms[pin].items()]
+        voltages = numpy.concatenate([b[0] for b in bins]) if bins else numpy.empty(0)
+        if not len(voltages):
+            continue
+        order = numpy.argsort(voltages, kind='stable')
+        voltages, counts = voltages[order], numpy.concatenate([b[1] for b in bins])[order]
+        values[pin] = {}
+        for name, method in methods.items():
+            if method in _histogram_methods:
+                values[pin][name] = float(_histogram_methods[method](voltages, counts))
+            else:
+                values[pin][name] = method(numpy.concatenate(reads[pin]).tolist())
+    return values
+
+
+def _info(args):
+    for path in args.files:
+        with ArchiveReader(path) as reader:
+            if reader.index:
+                span = f'{format_time(reader.index[0][0])} to {format_time(reader.index[-1][1])}'
+            else:
+                span = 'empty'
+            print(f'{path}: {len(reader.pins)} pins, {reader.sets} sets in {len(reader.index)} chunks, {span}')
+
+
+def _stats(args):
+    methods = measurements.log_methods
+    values = analyze(args.files, methods, args.start, args.end, args.pins, args.workers)
+
+    width = max([len(pin) for pin in values] + [3])
+    print(' ' * width + ''.join(f'{name:>12}' for name in methods))
+    for pin in values:
+        print(f'{pin:<{width}}' + ''.join(f'{values[pin][name]:>11.4f}V' for name in methods))
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog='archive.py', description='Batch analysis of PyScilloscope archives')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    info = commands.add_parser('info', help='show what each archive holds')
+    info.add_argument('files', nargs='+')
+    info.set_defaults(run=_info)
+
+    stats = commands.add_parser('stats', help='compute the Normal mode values over a time range')
+    stats.add_argument('files', nargs='+')
+    stats.add_argument('--start', type=parse_time, help='YYYY-MM-DD HH:MM:SS, or milliseconds since epoch')
+    stats.add_argument('--end', type=parse_time, help='YYYY-MM-DD HH:MM:SS, or milliseconds since epoch')
+    stats.add_argument('--pins', nargs='+')
+    stats.add_argument('--workers', type=int)
+    stats.set_defaults(run=_stats)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+# Main
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Math channels: signals derived from the pins given by the `start` handshake
+
+Each channel is an expression over the pin names, ex:
+
+    Diff = X1 - X2
+    Current = X3 / 0.1     # voltage across a 0.1 ohm shunt
+    Ripple = rms(X4, 50)   # RMS over the last 50 sets
+
+Supported: numbers, pin names, other math channels defined before, `+ - * / **`, and the functions in `MathChannels.functions`.
+
+The expressions are parsed and compiled once into a plan of NumPy operations.
+Identical subexpressions, even across channels, are only computed once per block.
+"""
+
+# Imports
+import ast
+import numpy
+
+_number_nodes = (ast.Constant, getattr(ast, 'Num', ast.Constant))  # Python 3.7 parses numbers as `ast.Num`
+
+
+# Methods
+def parse_definitions(text):
+    """
+    `text`: definitions separated by `;` or new lines
+    - Ex: `'Diff = X1 - X2; Current = X3 / 0.1'`
+
+    `return`: dict of name: expression, in the order they were given
+    """
+    definitions = {}
+    for line in text.replace(';', '\n').split('\n'):
+        if not line.strip():
+            continue
+        name, equals, expression = line.partition('=')
+        name = name.strip()
+        if not equals or not name.isidentifier() or not expression.strip():
+            raise ValueError(f'math channel must be `name = expression`, not {line.strip()!r}')
+        definitions[name] = expression.strip()
+    return definitions
+
+
+def _windowed(function):
+    """
+    Makes a windowed function over the last `n` values, which keeps its history between blocks
+    - the history is kept on the plan, so a new `MathChannels` starts empty
+    """
+    def windowed(state, table, n):
+        n = int(n)
+        table = numpy.atleast_1d(table)
+        history = state.get('history', numpy.empty(0))
+        joined = numpy.concatenate((history, table))
+        state['history'] = joined[-(n - 1):] if n > 1 else joined[:0]
+        return function(joined, n)[len(history):]
+    return windowed
+
+
+def _moving_mean(table, n):
+    sums = numpy.cumsum(table)
+    result = sums.copy()
+    result[n:] -= sums[:-n]
+    return result / numpy.minimum(numpy.arange(1, len(table) + 1), n)
+
+
+# Classes
+class MathChannels:
+    """
+    Compiles math channels, and evaluates them a block at a time
+
+    `definitions`: dict of name: expression
+    - see `parse_definitions`
+
+    `pins`: the names that can be used in the expressions
+    """
+
+    binary = {
+        ast.Add: numpy.add,
+        ast.Sub: numpy.subtract,
+        ast.Mult: numpy.multiply,
+        ast.Div: numpy.divide,
+        ast.Pow: numpy.power,
+    }
+    unary = {
+        ast.USub: numpy.negative,
+        ast.UAdd: numpy.positive,
+    }
+    # name: (method, amount of args, whether it keeps a history between blocks)
+    functions = {
+        'abs': (numpy.abs, 1, False),
+        'sqrt': (numpy.sqrt, 1, False),
+        'rms': (_windowed(lambda table, n: numpy.sqrt(_moving_mean(table * table, n))), 2, True),
+        'mean': (_windowed(_moving_mean), 2, True),
+    }
+
+    def __init__(self, definitions, pins):
+        self.pins = list(pins)
+        self.names = list(definitions)
+
+        self._keys = {}  # canonical expression: register, for reusing subexpressions
+        self._constants = {}  # register: value
+        self._loads = {}  # register: pin
+        self._steps = []  # (register, method, arg registers, state)
+        self._outputs = {}  # name: register
+        self._register_count = 0
+
+        for name, expression in definitions.items():
+            if name in self.pins or name in self._outputs:
+                raise ValueError(f'math channel {name!r} is already a pin or channel')
+            try:
+                tree = ast.parse(expression, mode='eval')
+            except SyntaxError:
+                raise ValueError(f'math channel {name!r} has invalid syntax: {expression!r}')
+            self._outputs[name] = self._compile(tree.body, name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _register(self, key):
+        if key not in self._keys:
+            self._keys[key] = self._register_count
+            self._register_count += 1
+        return self._keys[key]
+
+    def _compile(self, node, name):
+        """
+        `return`: the register that will hold the value of `node`
+        """
+        value = getattr(node, 'value', getattr(node, 'n', None))
+        if isinstance(node, _number_nodes) and isinstance(value, (int, float)):
+            register = self._register(('constant', value))
+            self._constants[register] = float(value)
+            return register
+        if isinstance(node, ast.Name):
+            if node.id in self._outputs:
+                return self._outputs[node.id]
+            if node.id not in self.pins:
+                raise ValueError(f'math channel {name!r} uses {node.id!r}, which is not a pin')
+            register = self._register(('pin', node.id))
+            self._loads[register] = node.id
+            return register
+        if isinstance(node, ast.BinOp) and type(node.op) in self.binary:
+            args = (self._compile(node.left, name), self._compile(node.right, name))
+            return self._step(self.binary[type(node.op)], args, ('binary', type(node.op).__name__, args))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in self.unary:
+            args = (self._compile(node.operand, name),)
+            return self._step(self.unary[type(node.op)], args, ('unary', type(node.op).__name__, args))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in self.functions and not node.keywords:
+            method, arg_count, stateful = self.functions[node.func.id]
+            if len(node.args) != arg_count:
+                raise ValueError(f'math channel {name!r}: {node.func.id}() takes {arg_count} argument(s)')
+            args = tuple(self._compile(arg, name) for arg in node.args)
+            if stateful and args[-1] not in self._constants:
+                raise ValueError(f'math channel {name!r}: the window of {node.func.id}() must be a number')
+            if stateful and self._constants[args[-1]] < 1:
+                raise ValueError(f'math channel {name!r}: the window of {node.func.id}() must be at least 1')
+            return self._step(method, args, ('call', node.func.id, args), stateful)
+        raise ValueError(f'math channel {name!r} uses something unsupported: {type(node).__name__}')
+
+    def _step(self, method, args, key, stateful=False):
+        if key in self._keys:
+            return self._keys[key]
+        register = self._register(key)
+        self._steps.append((register, method, args, {} if stateful else None))
+        return register
+
+    def evaluate(self, block):
+        """
+        `block`: dict of pin: values
+        - values can be a number, or an array of reads
+
+        `return`: dict of name: array of values, one for each read in the block
+        """
+        registers = [None] * self._register_count
+        for register, value in self._constants.items():
+            registers[register] = value
+        for register, pin in self._loads.items():
+            registers[register] = numpy.atleast_1d(numpy.asarray(block[pin], dtype=float))
+        for register, method, args, state in self._steps:
+            if state is None:
+                registers[register] = method(*(registers[a] for a in args))
+            else:
+                registers[register] = method(state, *(registers[a] for a in args))
+        length = max((len(registers[r]) for r in self._loads), default=1)
+        return {name: numpy.broadcast_to(registers[register], (length,)) for name, register in self._outputs.items()}
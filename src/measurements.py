@@ -0,0 +1,59 @@
+"""
+Turning ADC reads into voltages, and the values logged from them
+
+Kept apart from `module.py`, so `archive.py` (and each of its processes) can use them without loading Qt, Tk, or pyserial
+"""
+
+# Imports
+from statistics import mean, median, variance, stdev
+
+
+# Methods
+def dtv(d, vs, dmax=4095):
+    """
+    `d`: digital value
+    `vs`: The maximum voltage of the source
+    `dmax`: The max digital value of the adc converter
+
+    `return`: the voltage given a digital value
+    """
+    return vs/dmax*d
+
+
+def min(table):
+    """
+    `table`: the table in which you want the minimum value from
+
+    `return`: the minimum value in `table`
+    """
+    min = table[0]
+    for i in table:
+        if i < min:
+            min = i
+    return min
+
+
+def max(table):
+    """
+    `table`: the table in which you want the maximum value from
+
+    `return`: the maximum value in `table`
+    """
+    max = table[0]
+    for i in table:
+        if i > max:
+            max = i
+    return max
+
+
+# Finals
+# Add (or remove) a method that will return a single value from a table if you'd like more data
+# used by the Normal mode, and by `archive.py stats`
+log_methods = {
+    'min': min,
+    'max': max,
+    'mean': mean,
+    'median': median,
+    'variance': variance,
+    'std dev': stdev
+}
@@ -6,12 +6,18 @@ Just add a new class, and it will be detected. Easy as pie!
 # DO NOT IMPORT CLASSES!!! They will interfere with the whole reason this works at all
 # for Main
 from ast import literal_eval
+import sys  # for profiling this module
 import module  # for Event
+import archive  # for ArchiveWriter
+import channels  # for MathChannels
+import measurements  # for log_methods
 import datetime  # for datetime
 from pyqtgraph.Qt import QtCore
-from module import dtv, millis, elapsed_millis, min, max
+from module import millis, elapsed_millis
+from measurements import dtv, min, max
 from math import sqrt, floor
-from statistics import mean, median, variance, stdev
+from numpy import linspace, column_stack
+from statistics import mean
 
 
 # Classes
@@ -25,6 +31,24 @@ class Main:
     `timer_interval`: how quickly (in ms) new data will be collected
     `seconds_range`: the range of seconds that will be displayed on the x axis of each graph
     `voltage`: (not really needed, as it does not change) the voltage source supplied to the PyBoard's external devices... i.e. the ADC
+    `math_channels`: dict of name: expression for signals derived from the pins, ex: `{'Diff': 'X1 - X2'}`
+    - they are graphed, and logged like any other pin. See `channels.py`
+    `render_preset`: one of `module.RenderGovernor.presets`, trading the quality of the graphs for speed
+    `window`: a QtWindow to reuse, along with its graphs, from an earlier session
+    - a new one is made if None
+    `profiler`: a `module.Profiler` to time each stage of the pipeline with, None to not
+    - the report is written to `[Profile] ....json` when stopped
+    `stream`: a `stream.StreamServer` to publish every block to, None to not
+    `view`: one of `views`
+    - 'Grid': a graph for each pin
+    - 'Stacked': every pin in one graph, which is much cheaper to draw with a lot of pins
+
+    Sub-classes pass any of the keyword options after `seconds_range` through to here
+
+    `dataset`: dict of pin: array of the voltages read since the last update
+    `codes`: array of the raw ADC values of the same sets, of shape (sets, `device_pins`)
+    `times`: array of the time of each of those sets, in milliseconds since epoch
+    - the sets arrive together, so their times are spread evenly since the last update
 
     ___
     __Events:__
@@ -36,6 +60,7 @@ class Main:
     ___
     __Explicit Sub-Class Methods:__
     `make_log`: makes an Excel file for logging the data read
+    `make_archive`: makes a compressed archive for storing the raw reads
 
     ___
     __Implicit Sub-Class Methods:__
@@ -71,7 +96,9 @@ class Main:
     >> Don't import classes, else the user interface in `main.py` will see them in the mode selection menu
     """
 
-    def __init__(self, device, timer_interval=5, seconds_range=3, voltage=3.29):
+    views = ('Grid', 'Stacked')
+
+    def __init__(self, device, timer_interval=5, seconds_range=3, voltage=3.29, math_channels=None, render_preset='Auto', window=None, profiler=None, stream=None, view='Grid'):
         self.device = device
         if not self.device.is_open:
             self.device.open()
@@ -80,6 +107,14 @@ class Main:
         self.timer_interval = timer_interval
         self.seconds_range = seconds_range
         self.voltage_source = voltage
+        self.math_channels = math_channels or {}
+        self.render_preset = render_preset
+        self.sample_rate = round(1000 / timer_interval)  # sets per second sampled by the PyBoard
+        self.overruns = 0  # sets the PyBoard had to drop because they couldn't be sent in time
+        self.malformed = 0  # sets that arrived, but couldn't be parsed
+        self.profiler = profiler
+        self.stream = stream
+        self.view = view
 
         self.graphs = {}
 
@@ -88,13 +123,30 @@ class Main:
         self.Kill = module.Event(self.stop)
         self.Began = module.Event()
 
-        self.qwindow = module.QtWindow('PyScilloscope Graphs')  # The window that holds the graphs
+        self.qwindow = window or module.QtWindow('PyScilloscope Graphs')  # The window that holds the graphs
         self.timer = QtCore.QTimer()  # Timer that updates the graphs, and collects data
         self.timer.timeout.connect(self.update)
 
         self.i = 0
 
     def _make_graphs(self):
+        key = (type(self)._make_graph, self.view, tuple(self.pins), self.timer_interval, self.seconds_range, self.voltage_source)
+        if self.qwindow.graph_key == key:  # the same graphs as the last session, so they only need to be emptied
+            self.graphs = self.qwindow.graphs
+            for graph in self.graphs.values():
+                graph.reset()
+        else:
+            self.qwindow.clear()
+            self._layout_graphs()
+            self.qwindow.graphs = self.graphs
+            self.qwindow.graph_key = key
+        self.governor = module.RenderGovernor(self.qwindow, self.graphs.values(), self.timer_interval, self.render_preset)
+
+    def _layout_graphs(self):
+        if self.view == 'Stacked':
+            y_ranges = [(0, self.voltage_source) if pin in self.device_pins else None for pin in self.pins]  # math channels scale themselves
+            self.graphs = {'Stacked': module.StackedGraph(self.qwindow, self.pins, self.seconds_range, self.sample_rate, y_ranges)}
+            return
         column = 0
         gpr = floor(sqrt(len(self.pins)))  # graphs-per-row... the graphs in each row to make a grid
         for i, v in enumerate(self.pins):
@@ -103,47 +155,123 @@ class Main:
             else:
                 self.qwindow.layout.nextRow()
                 column = 1
-            self.graphs[v] = module.SecondBasedGraph(self.qwindow, title=v, timer_interval=self.timer_interval, x_range=(-(self.seconds_range), 0), y_range=(0, self.voltage_source))
+            self.graphs[v] = self._make_graph(v)
+
+    def _make_graph(self, pin):
+        """
+        `return`: the graph for `pin`
+        - sub-classes can override this for a different kind of graph
+        """
+        y_range = (0, self.voltage_source) if pin in self.device_pins else None  # math channels scale themselves
+        return module.SecondBasedGraph(self.qwindow, title=pin, timer_interval=self.timer_interval, x_range=(-(self.seconds_range), 0), y_range=y_range)
 
     def _update_graphs(self):
-        for pin in self.dataset:
-            self.graphs[pin].update(self.dataset[pin])  # dtv turns the ADC value into a voltage
+        draw = self.governor.begin_frame()  # the governor decides how often the graphs are drawn
+        if self.view == 'Stacked':
+            self.graphs['Stacked'].extend(self.dataset, draw)  # every pin at once
+        else:
+            for pin in self.dataset:
+                graph = self.graphs[pin]
+                graph.extend(self.dataset[pin], draw and not self.governor.is_hidden(graph))
+        self.governor.end_frame()
 
     def update(self):
-        try:
-            if self._running:
-                if self.device.readline() == 'newset':
-                    d_table = {}
-                    while True:
-                        data = self.device.readline()
-                        if data == 'endset':
-                            break
-                        data = literal_eval('{'+data+'}')
-                        pin = list(data.keys())[0]
-                        d_table[pin] = dtv(data[pin], self.voltage_source)
-                    self.dataset = d_table
-                    self._update_graphs()
-                    return self.dataset
-        except Exception:
-            pass
+        """
+        Parses every set that has arrived since the last update, all at once
+
+        `return`: `dataset`, or None if no sets were completed
+        """
+        if not self._running:
+            return
+        codes = self.parser.feed(self.device.read_available())
+        if (self.parser.overruns, self.parser.malformed) != (self.overruns, self.malformed):  # only when they change, as the title is redrawn
+            self.overruns, self.malformed = self.parser.overruns, self.parser.malformed
+            self.governor.status = f'{self.overruns} overruns, {self.malformed} malformed'
+            self.governor.report()
+        if not len(codes):
+            return
+        now = millis()
+        self.times = linspace(self._last_time, now, len(codes) + 1)[1:].round()  # spread over the time since the last update
+        self._last_time = now
+        self.codes = codes  # the raw ADC values, for archiving
+        voltages = dtv(codes, self.voltage_source)  # dtv turns the ADC values into voltages
+        d_table = {pin: voltages[:, i] for i, pin in enumerate(self.device_pins)}
+        d_table.update(self.math.evaluate(d_table))
+        self.dataset = d_table
+        self._update_graphs()
+        if self.stream and self.stream.clients:  # nothing to encode for nobody
+            self.stream.publish(column_stack([self.dataset[pin] for pin in self.pins]))
+        return self.dataset
 
     def start(self):
+        """
+        Starts the session with the PyBoard, and the graphs
+
+        Raises ValueError if the math channels don't fit the pins of the PyBoard,
+        in which case the PyBoard is stopped again
+        """
         self._running = True
         self.Began.fire()
         self.device.verify_write('start')
-        self.pins = literal_eval(self.device.read_timeout())
-        self.device.write(50000)
+        self.device_pins = list(literal_eval(self.device.read_timeout()))  # the pins read by the PyBoard
+        self.device.write(self.sample_rate)
+
+        try:
+            self.math = channels.MathChannels(self.math_channels, self.device_pins)  # compiled once, here
+        except ValueError:  # ex: a pin that the PyBoard doesn't have, so the session is ended before anything is made
+            self._running = False
+            self.device.soft_stop()
+            raise
+        self.pins = self.device_pins + self.math.names
+        self.parser = module.SetParser(self.device_pins)
+        self.overruns = self.malformed = 0
+        self._last_time = millis()
+        if self.stream:
+            self.stream.begin(self.pins, self.voltage_source, self.sample_rate)
 
         self._make_graphs()
 
+        if self.profiler:
+            self._profile()
+
         self.qwindow.show()
         self.timer.start(self.timer_interval)
 
+    def _profile(self):
+        """
+        Wraps each stage of the pipeline with `profiler`
+        """
+        this = sys.modules[__name__]
+        self.profiler.wrap(self.device, 'read_available', 'SerialDevice.read_available')
+        self.profiler.wrap(self.parser, 'feed', 'SetParser.feed')
+        self.profiler.wrap(this, 'dtv', 'dtv')
+        self.profiler.wrap(self.math, 'evaluate', 'MathChannels.evaluate')
+        self.profiler.wrap(self, '_update_graphs', 'Main._update_graphs')
+        for graph in self.graphs.values():
+            self.profiler.wrap(graph, 'extend', f'{type(graph).__name__}.extend')
+        if hasattr(self, 'log'):
+            self.profiler.wrap(self.log, 'write', 'Spreadsheet.write')
+        if self.stream:
+            self.profiler.wrap(self.stream, 'publish', 'StreamServer.publish')
+
     def stop(self, a=None, kw=None):
         self._running = False
         self.timer.stop()
         self.Ended.fire()
-        self.device.kill()
+        self.device.soft_stop()  # the connection, and the window, are kept for the next session
+        if self.profiler:
+            self.profiler.unwrap()
+            self.profiler.dump(self._file_name('Profile') + '.json')
+
+    def _file_name(self, mode):
+        """
+        `mode`: name of the mode making the file
+
+        `return`: `[MODE] - YYYY-MM-DD [HH-MM-SS.mmm]`
+        - down to the millisecond, as a session can be restarted within the same second
+        """
+        now = datetime.datetime.today()
+        return f'[{mode}] - {now:%Y-%m-%d} [{now:%H-%M-%S}.{now.microsecond // 1000:03}]'
 
     def make_log(self, mode, constant_memory=True):
         """
@@ -154,9 +282,7 @@ class Main:
 
         > https://xlsxwriter.readthedocs.io/working_with_memory.html?highlight=#performance-figures
         """
-        date_string = str(datetime.datetime.today()).replace(':', '-')[:-7]
-        string_split = date_string.split(' ')
-        log = module.Spreadsheet(f'[{mode}] - {string_split[0]} [{string_split[1]}]', 'ADC Reads')
+        log = module.Spreadsheet(self._file_name(mode), 'ADC Reads')
         log.num_format('voltage', '0.000V')
         log.color_format('pin', '#9C27B0', '#FAFAFA')
         log.color_format('data_type', '#1976d2', '#FAFAFA')
@@ -164,6 +290,31 @@ class Main:
         log.color_format('error', '#FF3D00', '#000000')
         return log
 
+    def write_drops(self, log, row):
+        """
+        Writes the sets that were dropped this session to `log`
+
+        `log`: a Spreadsheet made by `make_log`
+        `row`: the row to start at, two rows are written
+        """
+        log.write(0, row, 'overruns:', 'data_type')
+        log.write(1, row, self.overruns)
+        log.write(0, row + 1, 'malformed:', 'data_type')
+        log.write(1, row + 1, self.malformed)
+
+    def make_archive(self, mode, chunk_size=4096):
+        """
+        Makes a compressed archive of the raw reads
+        - must be called after `start`, as it needs the pins
+        - only the pins read by the PyBoard are kept, math channels can be derived again afterwards
+
+        `mode`: name of the mode making the file
+        `chunk_size`: the amount of sets in each chunk
+
+        > See `archive.py` for the format, and for analyzing the files
+        """
+        return archive.ArchiveWriter(self._file_name(mode) + '.psa', self.device_pins, self.voltage_source, chunk_size=chunk_size)
+
 
 class Normal(Main):
     """
@@ -172,21 +323,14 @@ class Normal(Main):
     Will log the data collected in an excel spreadsheet
     """
 
-    def __init__(self, device, timer_interval=50, seconds_range=10):
-        super().__init__(device, timer_interval, seconds_range)
+    # see `measurements.py` to add (or remove) a method, `archive.py stats` uses them as well
+    log_methods = measurements.log_methods
+
+    def __init__(self, device, timer_interval=50, seconds_range=10, **options):
+        super().__init__(device, timer_interval, seconds_range, **options)
         self.log = super().make_log('Normal', constant_memory=False)
         self.i = 0
 
-        # Add (or remove) a method that will return a single value from a table if you'd like more data
-        self.log_methods = {
-            'min': min,
-            'max': max,
-            'mean': mean,
-            'median': median,
-            'variance': variance,
-            'std dev': stdev
-        }
-
     def set_values(self):
         for i in self.pin_values:
             table = self.pin_reads[i]
@@ -213,6 +357,7 @@ class Normal(Main):
         for i, v in enumerate(self.pin_values):
             for j, k in enumerate(self.log_methods):
                 self.log.write(i+1, j+1, self.pin_values[v][k], 'voltage')
+        self.write_drops(self.log, len(self.log_methods) + 1)
         self.log.close()
         super().stop()
 
@@ -224,7 +369,7 @@ class Normal(Main):
 
         for i in self.dataset:
             v = self.dataset[i]
-            self.pin_reads[i].append(v)
+            self.pin_reads[i].extend(v.tolist())
 
 
 class Verbose(Main):
@@ -232,8 +377,8 @@ class Verbose(Main):
     Logs all reads every second.
     """
 
-    def __init__(self, device, timer_interval=50, seconds_range=10):
-        super().__init__(device, timer_interval, seconds_range)
+    def __init__(self, device, timer_interval=50, seconds_range=10, **options):
+        super().__init__(device, timer_interval, seconds_range, **options)
         self.current_data = []
         self.log = super().make_log('Verbose', constant_memory=True)
 
@@ -248,20 +393,67 @@ class Verbose(Main):
             self.log.write(self.pins.index(i)+1, 0, i, 'pin')  # writes all the pins in the file for easy reading
 
     def stop(self, a=None, kw=None):
+        self.write_drops(self.log, self.level)
         self.log.close()
         super().stop()
 
     def update(self):
         self.dataset = super().update()
+        if self.dataset:
+            for i in self.dataset:
+                self.current_data[i].extend(self.dataset[i].tolist())
         if elapsed_millis(self.start_time) >= 1000:  # if a second has passed
             self.start_time = millis()  # reset the start time
             self.log.write(0, self.level, str(datetime.datetime.now().time())[:-7], 'data_type')  # write the current time to the log
             for i, v in enumerate(self.current_data):
-                self.log.write(i+1, self.level, mean(self.current_data[v]), 'voltage')  # writes the mean voltage of all samples collected in the second to the log
+                if self.current_data[v]:
+                    self.log.write(i+1, self.level, mean(self.current_data[v]), 'voltage')  # writes the mean voltage of all samples collected in the second to the log
             self.current_data = {i: [] for i in self.pins}  # resets the data collection list
             self.level += 1
-        else:
-            if not self.dataset:
-                return
-            for i in self.dataset:
-                self.current_data[i].append(self.dataset[i])
+
+
+class Archive(Main):
+    """
+    Keeps every read in a compressed archive, for long-term retention
+
+    Use `archive.py` to analyze the files afterwards
+    """
+
+    def __init__(self, device, timer_interval=50, seconds_range=10, **options):
+        super().__init__(device, timer_interval, seconds_range, **options)
+
+    def start(self):
+        super().start()
+        self.archive = super().make_archive('Archive')
+        if self.profiler:
+            self.profiler.wrap(self.archive, 'extend', 'ArchiveWriter.extend')
+
+    def stop(self, a=None, kw=None):
+        self.archive.close()
+        super().stop()
+
+    def update(self):
+        self.dataset = super().update()
+        if not self.dataset:
+            return
+        self.archive.extend(self.times, self.codes)
+
+
+class Persistence(Main):
+    """
+    Analog scope style persistence, for repetitive signals
+
+    Shows where each signal spends its time, fading exponentially, rather than every value.
+    Each graph is a single image, so drawing costs the same no matter how many values are read.
+
+    `half_life`: seconds it takes a value to fade to half its brightness
+    """
+
+    def __init__(self, device, timer_interval=50, seconds_range=10, half_life=1, **options):
+        super().__init__(device, timer_interval, seconds_range, **options)
+        self.half_life = half_life
+        self.view = 'Grid'  # each pin is its own image
+
+    def _make_graph(self, pin):
+        y_range = (0, self.voltage_source) if pin in self.device_pins else None  # math channels can go anywhere, so they scale themselves
+        return module.PersistenceGraph(self.qwindow, title=pin, seconds=self.seconds_range, sample_rate=self.sample_rate, y_range=y_range, half_life=self.half_life)
@@ -1,6 +1,13 @@
 # Imports
 # for millis
 from time import time
+# dtv, min, max live in measurements.py, so archive.py doesn't need any of the imports below
+from measurements import dtv, min, max
+# for QtWindow, RenderGovernor, Profiler
+from time import perf_counter, perf_counter_ns
+# for Profiler
+from json import dump
+from math import ceil
 # for Event
 from types import FunctionType
 # for Spawn
@@ -10,9 +17,18 @@ from serial import Serial
 # for Spreadsheet
 from xlsxwriter import Workbook
 # for QtWindow, Graph, SecondBasedGraph
-from pyqtgraph import GraphicsView, GraphicsLayout
+from pyqtgraph import GraphicsView, GraphicsLayout, getConfigOption
+# for PersistenceGraph
+from pyqtgraph import ImageItem, ColorMap
+from pyqtgraph.Qt import QtCore
+from numpy import zeros, bincount, clip, isfinite
+# for StackedGraph
+from pyqtgraph import PlotCurveItem, mkPen
+from numpy import ones, concatenate, nanmin, nanmax, full, nan, isnan
 from pyqtgraph.Qt import QtGui
-from numpy import empty as Empty
+from numpy import empty as Empty, linspace
+# for SetParser
+from numpy import array as Array, flatnonzero, cumsum, arange, char
 # for TkWindow
 from tkinter import Tk
 from tkinter.ttk import Frame
@@ -41,17 +57,6 @@ def elapsed_millis(start_time):
     return millis() - start_time
 
 
-def dtv(d, vs, dmax=4095):
-    """
-    `d`: digital value
-    `vs`: The maximum voltage of the source
-    `dmax`: The max digital value of the adc converter
-
-    `return`: the voltage given a digital value
-    """
-    return vs/dmax*d
-
-
 def data_split(data, split_key):
     """
     `data`: the string being split
@@ -65,32 +70,6 @@ def data_split(data, split_key):
     return split
 
 
-def min(table):
-    """
-    `table`: the table in which you want the minimum value from
-
-    `return`: the minimum value in `table`
-    """
-    min = table[0]
-    for i in table:
-        if i < min:
-            min = i
-    return min
-
-
-def max(table):
-    """
-    `table`: the table in which you want the maximum value from
-
-    `return`: the maximum value in `table`
-    """
-    max = table[0]
-    for i in table:
-        if i > max:
-            max = i
-    return max
-
-
 def spawn(function):
     """
     Will run `function` in a seperate thread
@@ -140,6 +119,22 @@ def float_input(text, fallback=None):
             print("Must be a number (float)!")
 
 
+def _time_paint(owner, item):
+    """
+    Wraps the painting of `item`, adding how long it takes to `owner.paint_time`
+
+    `owner`: the graph `item` is drawn in
+    `item`: a PyQtGraph item, ex: a curve or an image
+    """
+    paint = item.paint
+
+    def timed_paint(*args):
+        start_time = perf_counter()
+        paint(*args)
+        owner.paint_time += perf_counter() - start_time
+    item.paint = timed_paint
+
+
 # Classes
 class Event:
     """
@@ -201,6 +196,22 @@ class SerialDevice(Serial):
         self.write('kill')
         super().close()
 
+    def soft_stop(self, timeout=500):
+        """
+        Stops the PyBoard's session without closing the connection, so another can be started
+
+        `timeout`: time, in milliseconds, alloted for the PyBoard to say it has stopped
+        """
+        self.write('stop')
+        start_time = millis()
+        tail = b''
+        while elapsed_millis(start_time) < timeout:
+            if super().in_waiting:
+                tail = (tail + super().read(super().in_waiting))[-16:]  # only the end is needed to find `stopped`
+                if b'stopped' in tail:
+                    break
+        super().reset_input_buffer()  # anything left over is from the old session
+
     def read_timeout(self, timeout=500, bytes=None):
         """
         `bytes`: given number of bytes to read from serial buffer
@@ -213,6 +224,16 @@ class SerialDevice(Serial):
                 if data:
                     return data.decode()
 
+    def read_available(self):
+        """
+        `return`: every byte waiting in the buffer, in one read
+        - not decoded
+        """
+        waiting = super().in_waiting
+        if waiting:
+            return super().read(waiting)
+        return b''
+
     def readline(self):
         """
         `return`: all bits in buffer until `\\n`
@@ -256,6 +277,82 @@ class SerialDevice(Serial):
         return data
 
 
+class SetParser:
+    """
+    Parses the text protocol written by `pyboard/main.py` in bulk:
+
+        newset
+        'X1': 123
+        ...
+        endset
+
+    Bytes are given as they arrive, and every complete set is parsed in one pass with NumPy.
+    A partial set is kept until the rest of it arrives.
+
+    `pins`: the pins in the order the PyBoard writes them
+
+    `sets`: sets parsed so far
+    `malformed`: sets that could not be parsed, and were dropped
+    `overruns`: the last total of sets the PyBoard reported dropping, via `overrun N`
+    """
+
+    _start = b'newset'
+    _end = b'endset'
+
+    def __init__(self, pins):
+        self.pins = list(pins)
+        self.sets = 0
+        self.malformed = 0
+        self.overruns = 0
+        self._keys = Array([repr(pin).encode() for pin in self.pins])  # ex: b"'X1'"
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """
+        `data`: bytes read from the device
+
+        `return`: the codes of every set completed by `data`, as an array of shape (sets, pins)
+        """
+        self._buffer += data
+        end = self._buffer.rfind(self._end + b'\n')
+        channels = len(self.pins)
+        if end < 0:
+            return Empty((0, channels), dtype='uint16')
+        end += len(self._end) + 1
+        lines = Array(bytes(self._buffer[:end]).split(b'\n')[:-1])
+        del self._buffer[:end]  # the partial set, if any, is kept for the next time
+
+        for line in lines[char.startswith(lines, b'overrun')]:  # rare, so a loop is fine
+            fields = line.split()
+            if len(fields) == 2 and fields[1].isdigit():
+                self.overruns = int(fields[1])
+            else:  # damaged on the way, so it can't be trusted
+                self.malformed += 1
+
+        is_start = lines == self._start
+        is_end = lines == self._end
+        starts = flatnonzero(is_start)
+        # a set is only whole if its `endset` is right after its values, with no other markers in between
+        markers = cumsum(is_start | is_end)
+        starts = starts[starts + channels + 1 < len(lines)]
+        whole = is_end[starts + channels + 1] & (markers[starts + channels] == markers[starts])
+        starts = starts[whole]
+        if not len(starts):
+            self.malformed += int(is_end.sum())
+            return Empty((0, channels), dtype='uint16')
+
+        rows = lines[starts[:, None] + 1 + arange(channels)]
+        parts = char.partition(rows, b':')
+        values = char.strip(parts[..., 2])
+        valid = ((parts[..., 0] == self._keys) & char.isdigit(values) & (char.str_len(values) <= 4)).all(axis=1)
+
+        codes = values[valid].astype('uint16')  # at most 4 digits, so it can't overflow
+        codes = codes[(codes <= 4095).all(axis=1)]  # the ADC is 12 bit, so anything more is malformed
+        self.sets += len(codes)
+        self.malformed += int(is_end.sum()) - len(codes)
+        return codes
+
+
 class Spreadsheet(Workbook):
     """
     Will create a Microsoft Excel spreadsheet
@@ -323,16 +420,42 @@ class Spreadsheet(Workbook):
 class QtWindow(GraphicsView):
     """
     Makes a Qt application, and window
+    - the Qt application is only made once, every other window reuses it
+
+    `graphs`: dict of the graphs in the window, kept between sessions by whoever makes them
+    `graph_key`: whatever the graphs were made from, to know if they can be reused
+    `paint_time`: seconds spent painting since it was last reset
+    `paint_count`: times painted since it was last reset
     """
 
     def __init__(self, title):
-        self._app = QtGui.QApplication([])
+        self._app = QtGui.QApplication.instance() or QtGui.QApplication([])
         super().__init__()  # GraphicsView requires a QApplication before it can be made
         super().setWindowTitle(title)
+        self.title = title
 
         self.layout = GraphicsLayout()  # for ease of organization
         super().setCentralItem(self.layout)
 
+        self.graphs = {}
+        self.graph_key = None
+        self.paint_time = 0
+        self.paint_count = 0
+
+    def clear(self):
+        """
+        Removes all the graphs
+        """
+        self.layout.clear()
+        self.graphs = {}
+        self.graph_key = None
+
+    def paintEvent(self, event):
+        start_time = perf_counter()
+        super().paintEvent(event)
+        self.paint_time += perf_counter() - start_time
+        self.paint_count += 1
+
     def close(self):
         super().close()
 
@@ -418,6 +541,9 @@ class SecondBasedGraph:
 
     `x_range`: x range (min, max)
     `y_range`: y range (min, max)
+    - None to scale automagically
+
+    `paint_time`: seconds spent painting the curves since it was last reset
     """
 
     def __init__(self, window, title='', y_label='', y_unit='', max_chunks=None, chunk_size=None, timer_interval=50, x_range=(-10, 0), y_range=(-5, 5)):
@@ -429,7 +555,8 @@ class SecondBasedGraph:
         self.plot.setLabel('left', y_label, y_unit)
         self.plot.setTitle(title)
         self.plot.setXRange(x_range[0], x_range[1])
-        self.plot.setYRange(y_range[0], y_range[1])
+        if y_range:
+            self.plot.setYRange(y_range[0], y_range[1])
 
         self._x_range = x_range
         self._curves = []   # will hold the curves that are at each second marker on the graph
@@ -438,31 +565,695 @@ class SecondBasedGraph:
         self._data = Empty((self._chunk_size + 1, 2))  # makes a list of empty arrays ex: [[0, 0]]
         self._i = 0  # just an index
         self._start_time = time()  # the beginning time in seconds since epoch
+        self._last_time = self._start_time  # the time of the last update
+        self._stale = False  # whether or not values have been stored since the last draw
+        self._antialias = getConfigOption('antialias')
+        self.paint_time = 0
 
     def show(self):
         self.window.show()
 
-    def update(self, value):
+    def update(self, value, draw=True):
+        """
+        `value`: the value at x=0
+        `draw`: whether or not the curves are redrawn
+        - if not, the value is only stored until the next time they are
+        """
+        self.extend((value,), draw)
+
+    def extend(self, values, draw=True):
+        """
+        `values`: the values read since the last update, the last being at x=0
+        - they are spread evenly over the time since the last update
+
+        `draw`: whether or not the curves are redrawn
+        - if not, the values are only stored until the next time they are
+        """
         now = time()  # current time in seconds since epoch for the purpose of comparison
+        times = linspace(self._last_time, now, len(values) + 1)[1:] - self._start_time
+        self._last_time = now
+        start = 0
+        while start < len(values):
+            i = self._i % self._chunk_size  # makes sure all the graphs are the correct size
+            if i == 0:  # if the plot is at capacity (dictated by self._chunk_size)
+                self._new_curve()
+            amount = self._chunk_size - i
+            if amount > len(values) - start:
+                amount = len(values) - start
+            self._data[i+1:i+1+amount, 0] = times[start:start+amount]  # what will become the x-axis of the curve
+            self._data[i+1:i+1+amount, 1] = values[start:start+amount]  # what will become the y-axis of the curve
+            self._i += amount
+            start += amount
+            self._stale = True  # before the next curve is made, so the end of this one is drawn
+        if draw:
+            self.draw(now)
+
+    def _new_curve(self):
+        if self._curves and self._stale:  # the last curve is complete, but may not have been drawn yet
+            self._curves[-1].setData(x=self._data[:, 0], y=self._data[:, 1])
+        curve = self.plot.plot(antialias=self._antialias)  # makes a new curve
+        _time_paint(self, curve.curve)  # the PlotDataItem's own curve is what is painted
+        self._curves.append(curve)  # adds the curve to the list of curves
+        last = self._data[-1]  # gets the last value of the data already presented
+        self._data = Empty((self._chunk_size + 1, 2))  # same as above... makes the empty arrays
+        self._data[0] = last  # moves the data back
+        while len(self._curves) > self._max_chunks:  # doesn't keep too many curves
+            c = self._curves.pop(0)  # removes the last curve from the list
+            self.plot.removeItem(c)  # 'physically' removes the curve
+
+    def draw(self, now=None):
+        """
+        Moves the curves back, and draws the values stored since the last draw
+
+        `now`: current time in seconds since epoch
+        """
+        if not self._curves:
+            return
+        now = now or time()
         for curve in self._curves:  # moves all the curves back every time a second passes
             curve.setPos(self._x_range[1]-(now - self._start_time), 0)
+        i = (self._i - 1) % self._chunk_size
+        self._curves[-1].setData(x=self._data[:i+2, 0], y=self._data[:i+2, 1])  # udpates y at x=0
+        self._stale = False
+
+    def reset(self):
+        """
+        Removes the curves, and starts again from 0, so the graph can be reused
+        """
+        for curve in self._curves:
+            self.plot.removeItem(curve)
+        self._curves = []
+        self._i = 0
+        self._start_time = time()
+        self._last_time = self._start_time
+        self._stale = False
+        self.paint_time = 0
+
+    def set_quality(self, downsample=1, antialias=None, clip_to_view=False):
+        """
+        `downsample`: only every `downsample`th value is drawn (peak values are kept)
+        `antialias`: whether or not the curves are smoothed, None for PyQtGraph's configured default
+        `clip_to_view`: whether or not values outside of the x range are skipped
+        """
+        self._antialias = getConfigOption('antialias') if antialias is None else antialias
+        self.plot.setDownsampling(ds=downsample, auto=False, mode='peak')
+        self.plot.setClipToView(clip_to_view)
+        for curve in self._curves:
+            curve.opts['antialias'] = self._antialias
+            curve.updateItems()
+
+    def set_visible(self, visible):
+        """
+        `visible`: whether or not the graph is shown
+        - values are still stored while it is not
+        """
+        self.plot.setVisible(visible)
+
+
+class PersistenceGraph:
+    """
+    Makes an analog scope style persistence graph via PyQtGraph
+
+    Each value is counted into a 2-D histogram of time by voltage, which fades exponentially,
+    so repetitive signals build up brightly while stray values fade away.
+    The histogram is drawn as one image, so drawing costs the same no matter how many values are read.
+
+    `window`: a Qt GraphicsView, and the parent of the graph
+    - must have a layout
+
+    `title`: title of the graph
+    `seconds`: the time it takes to sweep across the graph once
+    `sample_rate`: values per second, to place each value across the sweep
+    `y_range`: y range (min, max)
+    - None to scale automagically, widening (and moving what was counted) whenever a value falls outside of it
+
+    `size`: size of the histogram (time bins, voltage bins)
+    `half_life`: seconds it takes a value to fade to half its brightness
+
+    `paint_time`: seconds spent painting the image since it was last reset
+    """
+
+    def __init__(self, window, title='', seconds=3, sample_rate=200, y_range=(0, 3.3), size=(400, 200), half_life=1):
+        self.window = window
+        self.layout = self.window.layout
+        self.plot = self.layout.addPlot()  # makes the graph
+
+        self.plot.setLabel('bottom', 'Time', 's')
+        self.plot.setTitle(title)
+        self.plot.setXRange(0, seconds, padding=0)
+
+        self.image = ImageItem()
+        self.image.setLookupTable(ColorMap([0, 0.5, 1], [(0, 0, 0), (0, 160, 255), (255, 255, 255)]).getLookupTable(nPts=256))
+        self.plot.addItem(self.image)
+
+        self._seconds = seconds
+        self._initial_range = y_range
+        self._y_range = None
+        if y_range:
+            self._set_range(y_range)
+        self._size = size
+        self._sweep = round(seconds * sample_rate)  # values in one sweep
+        self._fade = 0.5 ** (1 / (half_life * sample_rate))  # how much is left of each value, after each value
+        self._histogram = zeros(size, dtype='float32')
+        self._i = 0  # values so far
+        self.paint_time = 0
+        _time_paint(self, self.image)
+
+    def show(self):
+        self.window.show()
+
+    def update(self, value, draw=True):
+        """
+        `value`: the next value
+        `draw`: whether or not the image is redrawn
+        """
+        self.extend((value,), draw)
+
+    def extend(self, values, draw=True):
+        """
+        `values`: the values read since the last update
+        `draw`: whether or not the image is redrawn
+        - if not, the values are only counted until the next time it is
+        """
+        width, height = self._size
+        values = Array(values, dtype=float)
+        self._histogram *= self._fade ** len(values)
+        columns = (self._i + arange(len(values))) % self._sweep * width // self._sweep
+        self._i += len(values)
+        finite = isfinite(values)  # ex: sqrt of a negative, which has nowhere to go
+        values, columns = values[finite], columns[finite]
+        if len(values) and self._initial_range is None:
+            self._fit(float(values.min()), float(values.max()))
+        if len(values):
+            rows = clip(((values - self._y_range[0]) / (self._y_range[1] - self._y_range[0]) * height).astype(int), 0, height - 1)
+            self._histogram += bincount(columns * height + rows, minlength=width * height).reshape(self._size)
+        if draw:
+            self.draw()
+
+    def draw(self):
+        """
+        Redraws the image
+        """
+        self.image.setImage(self._histogram, autoLevels=False, levels=(0, self._histogram.max() or 1))
+
+    def _set_range(self, y_range):
+        self._y_range = y_range
+        self.plot.setYRange(y_range[0], y_range[1], padding=0)
+        self.image.setRect(QtCore.QRectF(0, y_range[0], self._seconds, y_range[1] - y_range[0]))
+
+    def _fit(self, low, high):
+        """
+        Widens the y range to fit `low` to `high`, moving what was counted so far into the new rows
+        """
+        if self._y_range:
+            old_low, old_high = self._y_range
+            if old_low <= low and high <= old_high:
+                return
+            low = low if low < old_low else old_low  # `min` and `max` are overwritten above
+            high = high if high > old_high else old_high
+        margin = (high - low) * 0.1 or abs(high) * 0.1 or 1  # room to move, so it isn't widened every update
+        y_range = (low - margin, high + margin)
+        if self._y_range:
+            height = self._size[1]
+            centers = old_low + (arange(height) + 0.5) * (old_high - old_low) / height
+            rows = clip(((centers - y_range[0]) / (y_range[1] - y_range[0]) * height).astype(int), 0, height - 1)
+            move = zeros((height, height), dtype='float32')  # old row: new row
+            move[arange(height), rows] = 1
+            self._histogram = self._histogram @ move
+        self._set_range(y_range)
+
+    def reset(self):
+        """
+        Clears the histogram, so the graph can be reused
+        """
+        self._histogram[:] = 0
+        self._i = 0
+        self.paint_time = 0
+        if self._initial_range is None:
+            self._y_range = None  # scaled again from the next values
+
+    def set_quality(self, downsample=1, antialias=None, clip_to_view=False):
+        """
+        Only here to be governed like a SecondBasedGraph, the cost of the image depends only on its size
+        """
+
+    def set_visible(self, visible):
+        """
+        `visible`: whether or not the graph is shown
+        - values are still counted while it is not
+        """
+        self.plot.setVisible(visible)
+
+
+class StackedGraph:
+    """
+    Makes one PyQtGraph with every pin stacked on top of each other, sharing the axes
+
+    Every shown pin is drawn as one path, updated with one NumPy operation per frame,
+    so the cost of laying out and drawing does not grow with the amount of pins like a grid of graphs does
+
+    Click a pin to highlight it (again to stop), double click to hide or show it
+
+    `window`: a Qt GraphicsView, and the parent of the graph
+    - must have a layout
+
+    `pins`: the pins, from the bottom up
+    `seconds`: the range of seconds displayed on the x axis
+    `sample_rate`: values per second
+    `y_ranges`: the (min, max) of each pin, which is scaled to fill its lane
+    - None for a pin to scale automagically
+
+    `spacing`: height of each lane, 1 being the height of a pin's range
+
+    `paint_time`: seconds spent painting since it was last reset
+    """
+
+    def __init__(self, window, pins, seconds=3, sample_rate=200, y_ranges=None, spacing=1.2):
+        self.window = window
+        self.layout = self.window.layout
+        self.plot = self.layout.addPlot()  # makes the graph
+        self.pins = list(pins)
+
+        self.plot.setLabel('bottom', 'Time', 's')
+        self.plot.setXRange(-seconds, 0, padding=0)
+        self.plot.setYRange(-(spacing - 1) / 2, spacing * len(self.pins), padding=0)
+        self.plot.getAxis('left').setTicks([[(i * spacing + 0.5, pin) for i, pin in enumerate(self.pins)]])
+        self.plot.setMouseEnabled(x=False, y=False)
+
+        self._curve = PlotCurveItem()
+        self._highlight_curve = PlotCurveItem(pen=mkPen('y', width=2))
+        self.plot.addItem(self._curve)
+        self.plot.addItem(self._highlight_curve)
+        self._view_clicked = self.plot.vb.mouseClickEvent  # the ViewBox's own handling, ex: the right click menu
+        self.plot.vb.mouseClickEvent = self._clicked  # on the ViewBox rather than the scene, so it goes away with the graph
+
+        self._y_ranges = y_ranges or [None] * len(self.pins)
+        self._spacing = spacing
+        self._length = round(seconds * sample_rate)
+        self._x = (arange(self._length) - self._length + 1) / sample_rate  # the values are evenly spaced, so x never changes
+        self._values = full((len(self.pins), self._length), nan)  # a ring buffer, `self._i` being the next column
+        self._i = 0
+        self._downsample = 1
+        self.hidden = set()
+        self.highlighted = None
+        self.paint_time = 0
+        _time_paint(self, self._curve)
+        _time_paint(self, self._highlight_curve)
+
+    def show(self):
+        self.window.show()
+
+    def extend(self, block, draw=True):
+        """
+        `block`: dict of pin: the values read since the last update
+        `draw`: whether or not the path is redrawn
+        - if not, the values are only stored until the next time it is
+        """
+        values = Array([block[pin] for pin in self.pins])[:, -self._length:]
+        columns = (self._i + arange(values.shape[1])) % self._length
+        self._values[:, columns] = values
+        self._i = (self._i + values.shape[1]) % self._length
+        if draw:
+            self.draw()
+
+    def draw(self):
+        """
+        Redraws every shown pin as one path
+        """
+        ordered = concatenate((self._values[:, self._i:], self._values[:, :self._i]), axis=1)[:, ::-1][:, ::self._downsample][:, ::-1]
+        x = self._x[::-1][::self._downsample][::-1]
+        for i, y_range in enumerate(self._y_ranges):  # scales each pin into its lane
+            if y_range:
+                low, high = y_range
+            elif isnan(ordered[i]).all():  # nothing read yet
+                low, high = 0, 1
+            else:
+                low, high = nanmin(ordered[i]), nanmax(ordered[i])
+            ordered[i] = (ordered[i] - low) / ((high - low) or 1) + i * self._spacing
+        shown = [i for i, pin in enumerate(self.pins) if pin not in self.hidden]
+        connect = ones((len(shown), len(x)), dtype=bool)
+        connect[:, -1] = False  # each pin is its own line
+        self._curve.setData(x=concatenate([x] * len(shown)), y=ordered[shown].ravel(), connect=connect.ravel())
+        if self.highlighted in self.pins and self.highlighted not in self.hidden:
+            self._highlight_curve.setData(x=x, y=ordered[self.pins.index(self.highlighted)])
+        else:
+            self._highlight_curve.setData(x=[], y=[])
+
+    def toggle(self, pin):
+        """
+        Hides `pin` if it is shown, shows it if it is hidden
+        """
+        self.hidden ^= {pin}
+        self.draw()
+
+    def highlight(self, pin):
+        """
+        `pin`: the pin to highlight, None for none
+        """
+        self.highlighted = pin
+        self.draw()
+
+    def _clicked(self, event):
+        if event.button() != QtCore.Qt.LeftButton:
+            self._view_clicked(event)
+            return
+        event.accept()
+        position = self.plot.vb.mapSceneToView(event.scenePos())
+        lane = int(position.y() // self._spacing)
+        if not 0 <= lane < len(self.pins):
+            return
+        pin = self.pins[lane]
+        if event.double():
+            self.toggle(pin)
+        else:
+            self.highlight(None if pin == self.highlighted else pin)
+
+    def reset(self):
+        """
+        Clears the values, so the graph can be reused
+        """
+        self._values[:] = nan
+        self._i = 0
+        self.paint_time = 0
+
+    def set_quality(self, downsample=1, antialias=None, clip_to_view=False):
+        """
+        `downsample`: only every `downsample`th value is drawn
+        `antialias`: whether or not the path is smoothed, None for PyQtGraph's configured default
+        `clip_to_view`: unused, every value is always in view
+        """
+        self._downsample = downsample
+        antialias = getConfigOption('antialias') if antialias is None else antialias
+        for curve in (self._curve, self._highlight_curve):
+            curve.opts['antialias'] = antialias
+            curve.update()
+
+    def set_visible(self, visible):
+        """
+        `visible`: whether or not the graph is shown
+        - values are still stored while it is not
+        """
+        self.plot.setVisible(visible)
+
+
+class RenderGovernor:
+    """
+    Keeps drawing the graphs within a frame budget, by trading quality for speed
+
+    Measures the time each drawn frame takes (updating the curves, and painting the window),
+    and moves between `levels` depending on how it compares to `budget`
+
+    `window`: the QtWindow the graphs are in
+    `graphs`: the SecondBasedGraphs being governed
+    `timer_interval`: the interval (in ms) the graphs are updated at
+    - frames are timed by the clock, as the timer can fire less often than asked, this only allows for a late tick
+    `preset`: the name of one of the `presets`
+    - 'Auto' moves between levels automagically, the rest stay on one level
+    `budget`: the time (in ms) a frame should take
+    `frames`: the amount of frames measured before deciding whether or not to change
+    """
+
+    # best quality first
+    # `fps`: max frames drawn per second
+    # `downsample`: see SecondBasedGraph.set_quality
+    # `visible`: the portion of the graphs that are shown, the most expensive being hidden first
+    levels = (
+        {'fps': 60, 'downsample': 1, 'antialias': True, 'clip_to_view': False, 'visible': 1},
+        {'fps': 60, 'downsample': 1, 'antialias': False, 'clip_to_view': True, 'visible': 1},
+        {'fps': 30, 'downsample': 2, 'antialias': False, 'clip_to_view': True, 'visible': 1},
+        {'fps': 20, 'downsample': 4, 'antialias': False, 'clip_to_view': True, 'visible': 1},
+        {'fps': 10, 'downsample': 8, 'antialias': False, 'clip_to_view': True, 'visible': 1},
+        {'fps': 10, 'downsample': 8, 'antialias': False, 'clip_to_view': True, 'visible': 0.5},
+    )
+    presets = {'Auto': None, 'Quality': 0, 'Balanced': 2, 'Performance': 4}
+
+    def __init__(self, window, graphs, timer_interval, preset='Auto', budget=16, frames=30):
+        self.window = window
+        self.graphs = list(graphs)
+        self.timer_interval = timer_interval
+        self.auto = self.presets[preset] is None
+        self.preset = preset
+        self.budget = budget / 1000
+        self.frames = frames
+
+        self.level = None
+        self.status = ''  # added to the end of the title, ex: the sets that were dropped
+        self.frame_cost = 0  # average seconds per drawn frame, as of the last measurement
+        self.frame_time = 0  # average seconds between drawn frames, as of the last measurement
+        self._last_draw = None
+        self._frame_count = 0
+        self._update_time = 0
+        self._frame_start = None
+        self._last_frame = None
+
+        self.set_level(self.presets['Balanced'] if self.auto else self.presets[preset])  # 'Auto' starts in the middle
+
+    @property
+    def settings(self):
+        """
+        `return`: the current level, with how many graphs are shown
+        """
+        return dict(self.levels[self.level], shown=len(self.graphs) - len(self._hidden))
+
+    def set_level(self, level):
+        """
+        Applies the settings of `levels[level]` to the graphs
+
+        `level`: index of `levels`
+        """
+        self.level = level
+        settings = self.levels[level]
+        self._frame_interval = 1 / settings['fps'] - self.timer_interval / 2000  # half a tick early beats a whole tick late
+        self.frame_time = 0  # measured again at the new rate
+        hidden = len(self.graphs) - ceil(len(self.graphs) * settings['visible'])
+        self._hidden = sorted(self.graphs, key=lambda g: g.paint_time, reverse=True)[:hidden]
+        for graph in self.graphs:
+            graph.set_quality(settings['downsample'], settings['antialias'], settings['clip_to_view'])
+            graph.set_visible(graph not in self._hidden)
+        self.report()
+
+    def is_hidden(self, graph):
+        """
+        `return`: whether or not `graph` was hidden by the current level
+        - hidden graphs only need to store their values, drawing them is wasted
+        """
+        return graph in self._hidden
 
-        i = self._i % self._chunk_size  # makes sure all the graphs are the correct size
-        if i == 0:  # if the plot is at capacity (dictated by self._chunk_size)
-            curve = self.plot.plot()  # makes a new curve
-            self._curves.append(curve)  # adds the curve to the list of curves
-            last = self._data[-1]  # gets the last value of the data already presented
-            self._data = Empty((self._chunk_size + 1, 2))  # same as above... makes the empty arrays
-            self._data[0] = last  # moves the data back
-            while len(self._curves) > self._max_chunks:  # doesn't keep too many curves
-                c = self._curves.pop(0)  # removes the last curve from the list
-                self.plot.removeItem(c)  # 'physically' removes the curve
-        else:  # if the plot has more capacity (dictated by self._chunk_size)
-            curve = self._curves[-1]  # gets the last curve in the list (the curve at 0 on the x axis)
-        self._data[i+1, 0] = now - self._start_time  # what will become the x-axis of the curve
-        self._data[i+1, 1] = value  # what will become the y-axis of the curve
-        curve.setData(x=self._data[:i+2, 0], y=self._data[:i+2, 1])  # udpates y at x=0
-        self._i += 1
+    def report(self):
+        """
+        Shows the chosen settings, and the measured frame rate, in the title of the window
+        """
+        settings = self.settings
+        fps = f"{round(1 / self.frame_time)}/{settings['fps']}" if self.frame_time else settings['fps']
+        cost = f', {self.frame_cost * 1000:.1f}ms/frame' if self.frame_cost else ''
+        self.window.setWindowTitle(
+            f"{self.window.title} - {self.preset}: {fps} fps, "
+            f"{settings['downsample']}x downsampling, antialiasing {'on' if settings['antialias'] else 'off'}, "
+            f"clip to view {'on' if settings['clip_to_view'] else 'off'}, {settings['shown']}/{len(self.graphs)} graphs{cost}"
+            + (f' - {self.status}' if self.status else '')
+        )
+
+    def begin_frame(self):
+        """
+        Call before updating the graphs
+
+        `return`: whether or not the graphs should be drawn this update
+        - only once a frame's worth of time has actually passed since the last draw
+        """
+        now = perf_counter()
+        if self._last_draw is not None and now - self._last_draw < self._frame_interval:
+            return False
+        self._last_draw = now
+        self._frame_start = now
+        return True
+
+    def end_frame(self):
+        """
+        Call after updating the graphs
+        """
+        if self._frame_start is None:
+            return
+        now = perf_counter()
+        self._update_time += now - self._frame_start
+        self._frame_start = None
+        self._frame_count += 1
+        if self._last_frame is None:  # measuring starts from the end of the first frame
+            self._last_frame = now
+            self._frame_count = 0
+            self._update_time = 0
+            self.window.paint_time = 0
+            for graph in self.graphs:
+                graph.paint_time = 0
+        if self._frame_count >= self.frames:
+            self._measure(now)
+
+    def _measure(self, now):
+        self.frame_cost = (self._update_time + self.window.paint_time) / self._frame_count
+        self.frame_time = (now - self._last_frame) / self._frame_count
+        self._frame_count = 0
+        self._update_time = 0
+        self._last_frame = now
+        self.window.paint_time = 0
+        if self.auto:
+            if self.frame_cost > self.budget and self.level < len(self.levels) - 1:
+                self.set_level(self.level + 1)
+            elif self.frame_cost < self.budget / 3 and self.level > 0:
+                self.set_level(self.level - 1)
+            else:
+                self.report()
+        else:
+            self.report()
+        for graph in self.graphs:  # costs are measured over one level at a time
+            graph.paint_time = 0
+
+
+class Stage:
+    """
+    Latency histogram of one stage of the pipeline
+
+    `name`: name of the stage
+    `count`: times the stage has run
+    `total`: nanoseconds spent in the stage
+    `most`: nanoseconds the slowest run took
+    `buckets`: the amount of runs that took between `bounds(i)` nanoseconds
+    - each power of 2 is split into 4 buckets, so a bucket is at most 25% wide
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0
+        self.most = 0
+        self.buckets = [0] * 256  # enough for 64 bit durations
+
+    @staticmethod
+    def bucket(duration):
+        """
+        `return`: the index of the bucket `duration` falls in
+        - the bit length, and the two bits after the highest, like a float with a 2 bit mantissa
+        """
+        length = duration.bit_length()
+        if length < 3:  # 0 to 3 each get their own bucket
+            return duration
+        return 4 * (length - 2) + ((duration >> (length - 3)) & 3)
+
+    @staticmethod
+    def bounds(i):
+        """
+        `return`: the lowest duration in bucket `i`, and the lowest in the next one
+        """
+        if i < 4:
+            return i, i + 1
+        shift = i // 4 - 1
+        low = (4 + i % 4) << shift
+        return low, low + (1 << shift)
+
+    def add(self, duration):
+        """
+        `duration`: nanoseconds the stage took
+        """
+        self.count += 1
+        self.total += duration
+        self.buckets[self.bucket(duration)] += 1
+        if duration > self.most:
+            self.most = duration
+
+    def percentile(self, portion):
+        """
+        `portion`: 0 to 1, ex: 0.99
+
+        `return`: the upper bound, in nanoseconds, of the bucket the percentile falls in
+        - never more than `most`, as the slowest run can be anywhere within its bucket
+        """
+        target = portion * self.count
+        seen = 0
+        for i, amount in enumerate(self.buckets):
+            seen += amount
+            if amount and seen >= target:
+                upper = self.bounds(i)[1]
+                return upper if upper < self.most else self.most  # `min` is overwritten above
+        return 0
+
+    def summary(self):
+        """
+        `return`: dict of the stats of the stage, times in microseconds
+        """
+        return {
+            'count': self.count,
+            'total': self.total / 1000,
+            'mean': self.total / self.count / 1000 if self.count else 0,
+            'p50': self.percentile(0.5) / 1000,
+            'p90': self.percentile(0.9) / 1000,
+            'p99': self.percentile(0.99) / 1000,
+            'max': self.most / 1000,
+            'histogram': {self.bounds(i)[1]: amount for i, amount in enumerate(self.buckets) if amount},  # upper bound: amount
+        }
+
+
+class Profiler:
+    """
+    Times each stage of the pipeline by wrapping the methods that make it up
+
+    Nothing is wrapped until `wrap` is called, and `unwrap` puts the methods back,
+    so it costs nothing when it is not being used
+
+    `stages`: dict of name: Stage
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._wrapped = []  # (owner, attribute, what was in the owner's __dict__ before)
+
+    def wrap(self, owner, attribute, name):
+        """
+        Replaces `owner.attribute` with a version that is timed
+
+        `owner`: the object, or module, the method is found on
+        `attribute`: the name of the method
+        `name`: name of the stage
+        - stages can be shared, ex: the update of every graph
+        """
+        function = getattr(owner, attribute)
+        if name not in self.stages:
+            self.stages[name] = Stage(name)
+        stage = self.stages[name]
+
+        def timed(*args, **kwargs):
+            start_time = perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stage.add(perf_counter_ns() - start_time)
+        self._wrapped.append((owner, attribute, vars(owner).get(attribute)))
+        setattr(owner, attribute, timed)
+
+    def unwrap(self):
+        """
+        Puts back every method that was wrapped
+        """
+        for owner, attribute, original in reversed(self._wrapped):
+            if original is None:
+                delattr(owner, attribute)  # it was found on the class, not the object
+            else:
+                setattr(owner, attribute, original)
+        self._wrapped = []
+
+    def summary(self):
+        """
+        `return`: a line for each stage, slowest in total first
+        """
+        lines = []
+        for stage in sorted(self.stages.values(), key=lambda s: s.total, reverse=True):
+            values = stage.summary()
+            lines.append(f"{stage.name:<24}{values['count']:>8} calls {values['mean']:>9.1f}us mean {values['p99']:>9.1f}us p99 {values['max']:>9.1f}us max")
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        """
+        Writes every stage, and its histogram, to `path` as JSON
+        """
+        with open(path, 'w') as file:
+            dump({name: stage.summary() for name, stage in self.stages.items()}, file, indent=4)
 
 
 # Main
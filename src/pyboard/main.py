@@ -1,7 +1,10 @@
 from pyb import LED, ADC, USB_VCP, Pin
 from pyb import millis, elapsed_millis, delay, Timer
-from pyb import hard_reset
+from pyb import hard_reset, disable_irq, enable_irq
 from array import array
+import micropython
+
+micropython.alloc_emergency_exception_buf(100)  # so errors in the timer interrupt can be reported
 
 # User Variables
 pin_strings = (
@@ -27,6 +30,9 @@ usb = USB_VCP()
 indicator_light = LED(4)
 # Finals
 inf = 10**100
+max_rate = 1000  # most sets per second the USB can keep up with
+buffer_millis = 20  # roughly how long each buffer takes to fill
+max_sets = 64  # most sets in each buffer
 
 # Classes
 class VCP(USB_VCP):
@@ -58,6 +64,123 @@ class VCP(USB_VCP):
         self.write_encode(data)
         return data
 
+class Acquisition:
+    """
+    Samples every ADC on a timer interrupt, filling one buffer while the other is transmitted
+
+    `adcs`: the ADCs, in the same order as `pin_strings`
+    `rate`: sets sampled per second
+    `sets`: sets in each buffer
+
+    `overruns`: sets dropped because both buffers were full, i.e. the USB could not keep up
+    """
+
+    def __init__(self, adcs, rate, sets):
+        self.adcs = adcs
+        self.channels = len(adcs)
+        self.sets = sets
+        self.size = self.channels * sets
+        self.buffers = (array('H', bytes(2 * self.size)), array('H', bytes(2 * self.size)))
+
+        self.filling = 0  # the buffer being filled by the interrupt
+        self.index = 0  # the next value of that buffer
+        self.ready = -1  # the buffer waiting to be transmitted, -1 if none
+        self.overruns = 0
+
+        self._sample_callback = self._sample  # bound once, as the interrupt can't allocate
+        self.timer = Timer(8, freq=rate)
+
+    def start(self):
+        self.timer.callback(self._sample_callback)
+
+    def stop(self):
+        self.timer.callback(None)
+
+    def _sample(self, timer):
+        """
+        The interrupt. Must not allocate
+        """
+        if self.index == self.size:  # full, and the other buffer is still being transmitted
+            self.overruns += 1
+            return
+        buffer = self.buffers[self.filling]
+        index = self.index
+        for c in range(self.channels):
+            buffer[index + c] = self.adcs[c].read()
+        self.index = index + self.channels
+        if self.index == self.size and self.ready < 0:
+            self._swap()
+
+    def _swap(self):
+        self.ready = self.filling
+        self.filling ^= 1
+        self.index = 0
+
+    def release(self):
+        """
+        Call once the ready buffer has been transmitted
+        """
+        irq_state = disable_irq()
+        self.ready = -1
+        if self.index == self.size:  # the other buffer filled up in the meantime
+            self._swap()
+        enable_irq(irq_state)
+
+
+class SetWriter:
+    """
+    Formats buffers of sets into the text protocol, without allocating
+    Each set looks like:
+
+        newset
+        'X1':  123
+        ...
+        endset
+
+    Values are padded with spaces to a fixed width, so each set is written over the template in place,
+    and `SetParser` on the PC strips the padding back off
+
+    `pins`: the names of the pins
+    `sets`: sets in each buffer
+    """
+
+    def __init__(self, pins, sets):
+        self.channels = len(pins)
+        self.sets = sets
+        template = bytearray(b'newset\n')
+        offsets = []
+        for pin in pins:
+            template.extend("'{}': ".format(pin).encode())
+            offsets.append(len(template) + 3)  # the last digit
+            template.extend(b'    \n')
+        template.extend(b'endset\n')
+        self.set_length = len(template)
+        self.offsets = array('H', offsets)
+        self.text = bytearray(template * sets)
+
+    def format(self, buffer):
+        """
+        `buffer`: a buffer from `Acquisition`
+
+        `return`: `text`, holding every set in `buffer`
+        """
+        text = self.text
+        offsets = self.offsets
+        i = 0
+        for s in range(self.sets):
+            base = s * self.set_length
+            for c in range(self.channels):
+                value = buffer[i]
+                i += 1
+                position = base + offsets[c]
+                text[position] = 48 + value % 10  # 48 is '0'
+                value //= 10
+                for k in range(1, 4):
+                    text[position - k] = 48 + value % 10 if value else 32  # 32 is ' '
+                    value //= 10
+        return text
+
+
 # Methods
 def mean(table):
     total = 0
@@ -66,18 +189,24 @@ def mean(table):
     return total / len(table)
 
 
-def main():
+def session(usb):
     """
-    The method that controls everything.
+    Runs one session, from the 'start' handshake to 'stop' or 'kill'
 
     Initialization procedure:
     1: Wait for bytes from PC are specifically 'start'
         1a: Dim the indicator light
     2: Write the array of pins, `pin_strings`, so that the PC knows what it's working with
-    """
-    # Objects
-    usb = VCP()
+    3: Read the sample rate, in sets per second
+
+    Loop:
+    The timer interrupt samples continuously into one buffer, while the other is formatted and written.
+    If the USB falls behind, the sets that could not be kept are counted,
+    and `overrun N` (the total so far) is written between sets.
 
+    'stop' ends the session, writing `stopped` once nothing else will be written, so the PC can start another.
+    'kill' resets the PyBoard.
+    """
     # Initial
     while True:
         read = usb.read_timeout(inf)
@@ -90,30 +219,46 @@ def main():
     # Writes
     usb.write_encode(pin_strings)
     # Reads
-    timer_frequency = int(usb.verify_read(inf))
+    rate = min(int(usb.verify_read(inf)), max_rate)
     # Post init variables
+    sets = max(1, min(max_sets, rate * buffer_millis // 1000))
     pins = tuple(Pin(i) for i in pin_strings)
     adc_pins = tuple(ADC(p) for p in pins)
-    adc_arrays = tuple(array('H', [0]) for j in adc_pins)
-    timer = Timer(8, freq=timer_frequency)
+    acquisition = Acquisition(adc_pins, rate, sets)
+    writer = SetWriter(pin_strings, sets)
+    overruns = 0
+    acquisition.start()
     # Loop
     while True:
-        start_time = millis()
-        ADC.read_timed_multi(adc_pins, adc_arrays, timer)
+        if acquisition.ready >= 0:
+            usb.write(writer.format(acquisition.buffers[acquisition.ready]))
+            acquisition.release()
+            if acquisition.overruns != overruns:  # rare, so allocating here is fine
+                overruns = acquisition.overruns
+                usb.write_encode('overrun {}\n'.format(overruns))
+
+        if usb.any():
+            command = usb.read()
+            if command == b'stop':
+                acquisition.stop()
+                indicator_light.intensity(255)
+                usb.write_encode('stopped\n')
+                return
+            if command == b'kill':
+                acquisition.stop()
+                hard_reset()
 
-        if usb.read_timeout(1) == 'kill':
-            hard_reset()
 
-        write_table = {}
-        usb.write_encode('newset\n')
-        for i, v in enumerate(adc_arrays):
-            usb.write_encode('\'{pin}\': {value}\n'.format(pin=pin_strings[i], value=v[0]))
-            #write_table[pin_strings[i]] = v[0]
-        usb.write_encode('endset\n')
+def main():
+    """
+    The method that controls everything.
+    Runs sessions one after another, so the PC can stop and start again without resetting the PyBoard
+    """
+    # Objects
+    usb = VCP()
 
-        write_table['duration'] = elapsed_millis(start_time)
-        #usb.write_encode(str(write_table)+'\n')
-        #print(write_table)
+    while True:
+        session(usb)
 
 
 # Main
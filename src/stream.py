@@ -0,0 +1,264 @@
+"""
+Streams the sets being read to other computers over TCP, so more than one person can watch a PyBoard
+
+Every message is `MAGIC`, a kind, and a uint32 length, followed by that many bytes:
+- `HELLO` (client -> server): JSON of the client's options, ex: `{"decimate": 10}`
+- `HEADER` (server -> client): JSON of the pins, voltage source and sample rate, sent on connecting and whenever a session starts
+- `BLOCK` (server -> client): a uint32 amount of sets, then float32 voltages of shape (sets, pins)
+
+Each block is encoded once for each decimation asked for, and that same buffer is queued for every client that asked for it.
+Each client has its own bounded queue and thread, so a slow client only drops its own oldest blocks,
+and the acquisition only ever pays for encoding.
+
+> See `viewer.py` for watching a stream
+"""
+
+# Imports
+import json
+import socket
+import struct
+from collections import deque
+from threading import Thread, Event, Lock
+import numpy
+
+# Finals
+MAGIC = b'PS'
+HELLO = b'O'
+HEADER = b'H'
+BLOCK = b'B'
+
+_message_header = struct.Struct('<2scI')  # magic, kind, length
+_block_header = struct.Struct('<I')  # sets
+
+
+# Methods
+def _message(kind, payload):
+    return _message_header.pack(MAGIC, kind, len(payload)) + payload
+
+
+def _receive_exactly(connection, size):
+    """
+    `return`: `size` bytes from `connection`, or None if it was closed first
+    """
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def _receive_message(connection):
+    """
+    `return`: the kind and payload of the next message, or None if `connection` was closed
+    """
+    header = _receive_exactly(connection, _message_header.size)
+    if header is None:
+        return None
+    magic, kind, length = _message_header.unpack(header)
+    if magic != MAGIC:
+        raise ValueError('not a PyScilloscope stream')
+    payload = _receive_exactly(connection, length)
+    if payload is None:
+        return None
+    return kind, payload
+
+
+# Classes
+class _Client:
+    """
+    A connected viewer, with its own queue and sending thread
+
+    `queue_size`: the most blocks waiting to be sent before the oldest are dropped
+    """
+
+    def __init__(self, connection, decimate, queue_size):
+        self.connection = connection
+        self.decimate = decimate
+        self.dropped = 0
+        self._queue = deque(maxlen=queue_size)
+        self._header = None  # kept out of the queue, so it is never dropped
+        self._waiting = Event()
+        self._open = True
+        Thread(target=self._send_loop, daemon=True).start()
+
+    def send_header(self, message):
+        """
+        The blocks still waiting are from the last session, so they are dropped
+        """
+        self._queue.clear()
+        self._header = message
+        self._waiting.set()
+
+    def send(self, message):
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(message)  # the same buffer is shared by every client with the same decimation
+        self._waiting.set()
+
+    def close(self):
+        self._open = False
+        self._waiting.set()
+
+    def _send_loop(self):
+        try:
+            while self._open:
+                self._waiting.wait()
+                self._waiting.clear()
+                if self._header:
+                    header, self._header = self._header, None
+                    self.connection.sendall(header)
+                while self._queue and self._open and not self._header:
+                    self.connection.sendall(memoryview(self._queue.popleft()))
+        except OSError:
+            pass
+        self._open = False
+        self.connection.close()
+
+    @property
+    def open(self):
+        return self._open
+
+
+class StreamServer:
+    """
+    Serves the sets being read to any amount of viewers
+
+    `host`: the interface to listen on, ex: `'127.0.0.1'` for this computer only, `'0.0.0.0'` for every interface
+    `port`: the port to listen on, 0 for any free port
+    `queue_size`: the most blocks waiting to be sent to each client before the oldest are dropped
+    - bigger value = more memory, but slow clients drop less
+    """
+
+    def __init__(self, host='127.0.0.1', port=5025, queue_size=64):
+        self.queue_size = queue_size
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self._socket.listen()
+        self.host, self.port = self._socket.getsockname()[:2]
+        self._clients = []
+        self._lock = Lock()
+        self._header = None
+        self._published = 0  # sets published this session, so decimation carries over between blocks
+        Thread(target=self._accept_loop, daemon=True).start()
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    def begin(self, pins, voltage, rate):
+        """
+        Tells every client, and every client that connects later, what is being streamed
+
+        `pins`: the names of the columns of each block
+        `voltage`: the voltage source supplied to the ADC
+        `rate`: the sets read per second, before any decimation
+        """
+        self._header = _message(HEADER, json.dumps({'pins': list(pins), 'voltage': voltage, 'rate': rate}).encode())
+        self._published = 0
+        with self._lock:
+            for client in self._clients:
+                client.send_header(self._header)
+
+    def publish(self, block):
+        """
+        `block`: array of voltages of shape (sets, pins)
+        """
+        with self._lock:
+            self._clients = [client for client in self._clients if client.open]
+            clients = list(self._clients)
+        messages = {}  # decimation: message, so each is only encoded once
+        for client in clients:
+            if client.decimate not in messages:
+                first = -self._published % client.decimate
+                sets = numpy.ascontiguousarray(block[first::client.decimate], dtype='float32')
+                messages[client.decimate] = _message(BLOCK, _block_header.pack(len(sets)) + sets.tobytes()) if len(sets) else None
+            if messages[client.decimate]:
+                client.send(messages[client.decimate])
+        self._published += len(block)
+
+    def close(self):
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)  # wakes up accept(), so the port is actually released
+        except OSError:  # ex: it was never connected to on some platforms
+            pass
+        self._socket.close()
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients = []
+
+    def _accept_loop(self):
+        while True:
+            try:
+                connection, address = self._socket.accept()
+            except OSError:  # closed
+                return
+            Thread(target=self._greet, args=(connection,), daemon=True).start()
+
+    def _greet(self, connection):
+        try:
+            message = _receive_message(connection)
+            if message is None or message[0] != HELLO:
+                connection.close()
+                return
+            options = json.loads(message[1] or b'{}')
+            decimate = max(1, int(options.get('decimate', 1)))
+        except (OSError, ValueError, TypeError, AttributeError, OverflowError):  # ex: options that aren't a dict, or a decimate that isn't a number
+            connection.close()
+            return
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = _Client(connection, decimate, self.queue_size)
+        with self._lock:
+            if self._header:
+                client.send_header(self._header)
+            self._clients.append(client)
+
+
+class StreamClient:
+    """
+    Connects to a `StreamServer`
+
+    `host`: the address of the computer reading the PyBoard
+    `port`: the port it is streaming on
+    `decimate`: only every `decimate`th set is sent, done by the server
+    `timeout`: seconds alloted to connect
+
+    `pins`, `voltage`, `rate`: from the last header, None until one is received
+    """
+
+    def __init__(self, host, port, decimate=1, timeout=5):
+        self.host = host
+        self.port = port
+        self.decimate = decimate
+        self._socket = socket.create_connection((host, port), timeout)
+        self._socket.settimeout(None)
+        self._socket.sendall(_message(HELLO, json.dumps({'decimate': decimate}).encode()))
+        self.pins = None
+        self.voltage = None
+        self.rate = None
+
+    def receive(self):
+        """
+        Waits for the next block, reading any headers on the way
+
+        `return`: array of voltages of shape (sets, `pins`), or None if the server closed the connection
+        """
+        while True:
+            message = _receive_message(self._socket)
+            if message is None:
+                return None
+            kind, payload = message
+            if kind == HEADER:
+                header = json.loads(payload)
+                self.pins = header['pins']
+                self.voltage = header['voltage']
+                self.rate = header.get('rate')
+            elif kind == BLOCK:
+                sets, = _block_header.unpack_from(payload)
+                return numpy.frombuffer(payload, dtype='float32', offset=_block_header.size).reshape(sets, len(self.pins))
+
+    def close(self):
+        self._socket.close()
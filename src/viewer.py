@@ -0,0 +1,106 @@
+"""
+Watches the sets streamed by another PyScilloscope, see `stream.py`
+
+    python viewer.py HOST [PORT] [--decimate N] [--seconds S]
+
+`--decimate`: only every Nth set is sent, to spare the network (and this computer)
+`--seconds`: the range of seconds displayed on the x axis of each graph
+"""
+
+# Imports
+from argparse import ArgumentParser
+from collections import deque
+from math import sqrt, floor
+from threading import Thread
+from numpy import concatenate
+from pyqtgraph.Qt import QtCore
+from module import QtWindow, SecondBasedGraph
+from stream import StreamClient
+
+# Default Values
+d_port = 5025
+d_timer_interval = 16  # how often (in ms) the graphs are updated
+d_seconds_range = 3
+
+
+# Classes
+class Viewer:
+    """
+    Graphs a stream the same way `modes.Main` graphs the PyBoard
+
+    `client`: a connected StreamClient
+    `timer_interval`: how often (in ms) the graphs are updated
+    `seconds_range`: the range of seconds displayed on the x axis of each graph
+    """
+
+    def __init__(self, client, timer_interval=d_timer_interval, seconds_range=d_seconds_range):
+        self.client = client
+        self.timer_interval = timer_interval
+        self.seconds_range = seconds_range
+        self.pins = None
+        self.rate = None
+        self.graphs = {}
+
+        self._blocks = deque()  # (header, block) from the receiving thread, the header being (pins, rate)
+        self.qwindow = QtWindow(f'PyScilloscope Viewer - {client.host}:{client.port}')
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.update)
+        Thread(target=self._receive_loop, daemon=True).start()
+
+    def _receive_loop(self):
+        while True:
+            block = self.client.receive()
+            if block is None:
+                return
+            self._blocks.append(((tuple(self.client.pins), self.client.rate), block))
+
+    def _make_graphs(self, pins, rate):
+        """
+        `rate`: the sets read per second by the PyBoard, so each curve is a second of the decimated sets
+        - None to guess from `timer_interval`, as older streams don't send it
+        """
+        self.qwindow.clear()
+        self.graphs = {}
+        chunk_size = max(1, round(rate / self.client.decimate)) if rate else None
+        column = 0
+        gpr = floor(sqrt(len(pins)))  # graphs-per-row... the graphs in each row to make a grid
+        for v in pins:
+            if column < gpr:
+                column += 1
+            else:
+                self.qwindow.layout.nextRow()
+                column = 1
+            self.graphs[v] = SecondBasedGraph(self.qwindow, title=v, chunk_size=chunk_size, timer_interval=self.timer_interval, x_range=(-(self.seconds_range), 0), y_range=None)  # math channels may be streamed too
+        self.pins = pins
+        self.rate = rate
+
+    def update(self):
+        blocks = []
+        while self._blocks:
+            (pins, rate), block = self._blocks.popleft()
+            if pins != self.pins or rate != self.rate:  # a new session started
+                self._make_graphs(pins, rate)
+                blocks = []
+            blocks.append(block)
+        if not blocks:
+            return
+        block = concatenate(blocks)
+        for i, pin in enumerate(self.pins):
+            self.graphs[pin].extend(block[:, i])
+
+    def run(self):
+        self.qwindow.show()
+        self.timer.start(self.timer_interval)
+        self.qwindow._app.exec_()
+
+
+# Main
+if __name__ == '__main__':
+    parser = ArgumentParser(prog='viewer.py', description='Watch a PyScilloscope stream')
+    parser.add_argument('host')
+    parser.add_argument('port', nargs='?', type=int, default=d_port)
+    parser.add_argument('--decimate', type=int, default=1)
+    parser.add_argument('--seconds', type=int, default=d_seconds_range)
+    args = parser.parse_args()
+
+    Viewer(StreamClient(args.host, args.port, args.decimate), seconds_range=args.seconds).run()